@@ -1,14 +1,14 @@
 import streamlit as st
 import requests
 import datetime
-import json
 import time
 import pandas as pd
 import plotly.express as px
-from concurrent.futures import ThreadPoolExecutor
 import uuid
 from math import isnan
 from utils import set_background, set_dark_mode
+from notion_api import get_client
+from spotify_api import get_playcount, spotify_get
 
 st.set_page_config(layout="wide")
 set_dark_mode()
@@ -18,31 +18,16 @@ set_background("https://wallpapershome.com/images/pages/pic_h/26334.jpg")
 tracking_db_id = st.secrets["notion"]["tracking_db_id"]      # Weeks-/Tracking-Datenbank
 songs_database_id = st.secrets["notion"]["songs_db_id"]      # Songs-Datenbank
 notion_secret = st.secrets["notion"]["token"]
-notion_query_endpoint = "https://api.notion.com/v1/databases"
-notion_page_endpoint = "https://api.notion.com/v1/pages"
-notion_headers = {
-    "Authorization": f"Bearer {notion_secret}",
-    "Content-Type": "application/json",
-    "Notion-Version": "2022-06-28"
-}
+notion = get_client(notion_secret)
 
 # === Spotify-Konfiguration ===
 SPOTIFY_CLIENT_ID = st.secrets["spotify"]["client_id"]
 SPOTIFY_CLIENT_SECRET = st.secrets["spotify"]["client_secret"]
 
-def get_spotify_token():
-    url = "https://open.spotify.com/get_access_token?reason=transport&productType=web_player"
-    response = requests.get(url)
-    response.raise_for_status()
-    return response.json().get("accessToken")
-
-SPOTIFY_TOKEN = get_spotify_token()
-
-def get_spotify_popularity(track_id, token):
+def get_spotify_popularity(track_id):
     """Holt den echten Spotify-Popularity-Wert (0–100) für einen Track."""
     url = f"https://api.spotify.com/v1/tracks/{track_id}"
-    headers = {"Authorization": f"Bearer {token}"}
-    response = requests.get(url, headers=headers)
+    response = spotify_get(url)
     response.raise_for_status()
     data = response.json()
     return data.get("popularity", 0)
@@ -60,61 +45,41 @@ def parse_rollup_text(rollup):
                     texts.append(date_info["start"])
     return " ".join(texts).strip()
 
-def get_track_name_from_page(page_id):
-    url = f"{notion_page_endpoint}/{page_id}"
-    response = requests.get(url, headers=notion_headers)
-    if response.status_code == 200:
-        page = response.json()
-        if "properties" in page and "Track Name" in page["properties"]:
-            title_prop = page["properties"]["Track Name"].get("title", [])
-            return "".join([t.get("plain_text", "") for t in title_prop]).strip()
+async def get_track_name_from_page(page_id):
+    try:
+        page = await notion.get_page(page_id)
+    except requests.HTTPError:
+        return "Unbekannter Track"
+    if "properties" in page and "Track Name" in page["properties"]:
+        title_prop = page["properties"]["Track Name"].get("title", [])
+        return "".join([t.get("plain_text", "") for t in title_prop]).strip()
     return "Unbekannter Track"
 
 def get_track_id_from_page(page_id):
-    url = f"{notion_page_endpoint}/{page_id}"
-    response = requests.get(url, headers=notion_headers)
-    if response.status_code == 200:
-        page = response.json()
-        if "properties" in page and "Track ID" in page["properties"]:
-            text_prop = page["properties"]["Track ID"].get("rich_text", [])
-            return "".join([t.get("plain_text", "") for t in text_prop]).strip()
+    try:
+        page = notion.run(notion.get_page(page_id))
+    except requests.HTTPError:
+        return ""
+    if "properties" in page and "Track ID" in page["properties"]:
+        text_prop = page["properties"]["Track ID"].get("rich_text", [])
+        return "".join([t.get("plain_text", "") for t in text_prop]).strip()
     return ""
 
 def update_growth_for_measurement(entry_id, growth):
-    url = f"{notion_page_endpoint}/{entry_id}"
-    payload = {"properties": {"Growth": {"number": growth}}}
-    response = requests.patch(url, headers=notion_headers, json=payload)
-    response.raise_for_status()
+    notion.run(notion.update_page(entry_id, {"Growth": {"number": growth}}))
 
 
 
 def update_streams_for_measurement(entry_id, streams):
-    url = f"{notion_page_endpoint}/{entry_id}"
-    payload = {"properties": {"Streams": {"number": streams}}}
-    response = requests.patch(url, headers=notion_headers, json=payload)
-    response.raise_for_status()
+    notion.run(notion.update_page(entry_id, {"Streams": {"number": streams}}))
 
 # Für Streams
-def get_spotify_playcount(track_id, token):
-    variables = json.dumps({"uri": f"spotify:track:{track_id}"})
-    extensions = json.dumps({
-        "persistedQuery": {
-            "version": 1,
-            "sha256Hash": "26cd58ab86ebba80196c41c3d48a4324c619e9a9d7df26ecca22417e0c50c6a4"
-        }
-    })
-    params = {"operationName": "getTrack", "variables": variables, "extensions": extensions}
-    url = "https://api-partner.spotify.com/pathfinder/v1/query"
-    headers = {"Authorization": f"Bearer {token}"}
-    response = requests.get(url, headers=headers, params=params)
-    response.raise_for_status()
-    data = response.json()
-    return int(data["data"]["trackUnion"].get("playcount", 0))
+get_spotify_playcount = get_playcount
 
 def get_spotify_data(spotify_track_id):
     """Nur für Cover und externen Link."""
     url = f"https://api.spotify.com/v1/tracks/{spotify_track_id}"
-    response = requests.get(url, headers={"Authorization": f"Bearer {SPOTIFY_TOKEN}"})
+    response = spotify_get(url)
     if response.status_code == 200:
         data = response.json()
         cover_url = ""
@@ -126,30 +91,16 @@ def get_spotify_data(spotify_track_id):
 
 @st.cache_data(show_spinner=False)
 def get_metadata_from_tracking_db():
-    url = f"{notion_query_endpoint}/{tracking_db_id}/query"
-    payload = {"page_size": 100}
-    pages = []
-    has_more = True
-    start_cursor = None
-    while has_more:
-        if start_cursor:
-            payload["start_cursor"] = start_cursor
-        response = requests.post(url, headers=notion_headers, json=payload)
-        response.raise_for_status()
-        data = response.json()
-        pages.extend(data.get("results", []))
-        has_more = data.get("has_more", False)
-        start_cursor = data.get("next_cursor")
+    pages = notion.run(notion.query(tracking_db_id))
     metadata = {}
-    with ThreadPoolExecutor() as executor:
-        futures = {}
-        for page in pages:
-            props = page.get("properties", {})
-            song_relations = props.get("Song", {}).get("relation", [])
-            if song_relations:
-                related_page_id = song_relations[0].get("id")
-                futures[related_page_id] = executor.submit(get_track_name_from_page, related_page_id)
-        track_names = {key: future.result() for key, future in futures.items()}
+    related_page_ids = []
+    for page in pages:
+        props = page.get("properties", {})
+        song_relations = props.get("Song", {}).get("relation", [])
+        if song_relations and song_relations[0].get("id") not in related_page_ids:
+            related_page_ids.append(song_relations[0].get("id"))
+    names = notion.run_all([get_track_name_from_page(page_id) for page_id in related_page_ids])
+    track_names = dict(zip(related_page_ids, names))
     for page in pages:
         props = page.get("properties", {})
         song_relations = props.get("Song", {}).get("relation", [])
@@ -177,26 +128,8 @@ def get_metadata_from_tracking_db():
 def get_tracking_entries():
     if "tracking_entries" in st.session_state:
         return st.session_state.tracking_entries
-    url = f"{notion_query_endpoint}/{tracking_db_id}/query"
-    payload = {"page_size": 100}
-    pages = []
-    has_more = True
-    start_cursor = None
-    retry_delay = 1
-    while has_more:
-        if start_cursor:
-            payload["start_cursor"] = start_cursor
-        response = requests.post(url, headers=notion_headers, json=payload)
-        if response.status_code == 429:
-            time.sleep(retry_delay)
-            retry_delay *= 2
-            continue
-        response.raise_for_status()
-        data = response.json()
-        pages.extend(data.get("results", []))
-        has_more = data.get("has_more", False)
-        start_cursor = data.get("next_cursor")
-        retry_delay = 1
+    # 429 mit Retry-After behandelt der Notion-Client
+    pages = notion.run(notion.query(tracking_db_id))
     entries = []
     for page in pages:
         entry_id = page.get("id")
@@ -220,20 +153,7 @@ def get_tracking_entries():
     return entries
 
 def get_all_song_page_ids():
-    url = f"{notion_query_endpoint}/{songs_database_id}/query"
-    payload = {"page_size": 100}
-    pages = []
-    has_more = True
-    start_cursor = None
-    while has_more:
-        if start_cursor:
-            payload["start_cursor"] = start_cursor
-        response = requests.post(url, headers=notion_headers, json=payload)
-        response.raise_for_status()
-        data = response.json()
-        pages.extend(data.get("results", []))
-        has_more = data.get("has_more", False)
-        start_cursor = data.get("next_cursor")
+    pages = notion.run(notion.query(songs_database_id))
     song_pages = []
     for page in pages:
         page_id = page["id"]
@@ -244,21 +164,9 @@ def get_all_song_page_ids():
     return song_pages
 
 def get_tracking_entries_for_song(song_id):
-    url = f"{notion_query_endpoint}/{tracking_db_id}/query"
-    payload = {
-       "filter": {
-           "property": "Song",
-           "relation": {
-               "contains": song_id
-           }
-       },
-       "page_size": 100
-    }
-    response = requests.post(url, headers=notion_headers, json=payload)
-    response.raise_for_status()
-    data = response.json()
+    pages = notion.run(notion.query(tracking_db_id, {"property": "Song", "relation": {"contains": song_id}}))
     entries = []
-    for page in data.get("results", []):
+    for page in pages:
          entry_id = page.get("id")
          props = page.get("properties", {})
          pop = props.get("Popularity Score", {}).get("number")
@@ -279,33 +187,30 @@ def create_week_entry(song_page_id, popularity_score, track_id):
     now = datetime.datetime.now()
     now_with_offset = now + datetime.timedelta(seconds=1)
     now_iso = now_with_offset.isoformat()
-    payload = {
-        "parent": { "database_id": tracking_db_id },
-        "properties": {
-            "Name": {
-                "title": [
-                    { "text": { "content": f"Week of {now_iso[:10]}" } }
-                ]
-            },
-            "Song": {
-                "relation": [
-                    { "id": song_page_id }
-                ]
-            },
-            "Popularity Score": {
-                "number": popularity_score
-            },
-            "Date": {
-                "date": { "start": now_iso }
-            },
-            "Notion Track ID": {
-                "rich_text": [
-                    { "text": { "content": track_id } }
-                ]
-            }
+    properties = {
+        "Name": {
+            "title": [
+                { "text": { "content": f"Week of {now_iso[:10]}" } }
+            ]
+        },
+        "Song": {
+            "relation": [
+                { "id": song_page_id }
+            ]
+        },
+        "Popularity Score": {
+            "number": popularity_score
+        },
+        "Date": {
+            "date": { "start": now_iso }
+        },
+        "Notion Track ID": {
+            "rich_text": [
+                { "text": { "content": track_id } }
+            ]
         }
     }
-    requests.post(notion_page_endpoint, headers=notion_headers, json=payload)
+    notion.run(notion.create_page(tracking_db_id, properties))
 
 def get_new_music():
     st.write("Rufe neue Musik aus Playlisten ab...")
@@ -325,7 +230,6 @@ def update_popularity():
     progress_bar = st.progress(0)
     status_text = st.empty()
     
-    spotify_token = get_spotify_token()
     song_pages = get_all_song_page_ids()
     total = len(song_pages)
 
@@ -337,7 +241,7 @@ def update_popularity():
         if not track_id:
             track_id = str(uuid.uuid4())
         try:
-            spotify_pop = get_spotify_popularity(track_id, spotify_token)
+            spotify_pop = get_spotify_popularity(track_id)
         except Exception as e:
             st.write(f"Fehler bei Track ID {track_id}: {e}")
             spotify_pop = 0
@@ -392,10 +296,10 @@ def update_popularity():
         streams = 0
         if spotify_track_id:
             try:
-                streams = get_spotify_playcount(spotify_track_id, spotify_token)
+                streams = get_spotify_playcount(spotify_track_id)
                 if streams == 0:
                     time.sleep(1)
-                    streams = get_spotify_playcount(spotify_track_id, spotify_token)
+                    streams = get_spotify_playcount(spotify_track_id)
             except Exception as e:
                 streams = 0
         update_streams_for_measurement(latest_entry_id, streams)
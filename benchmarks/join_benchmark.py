@@ -0,0 +1,78 @@
+"""
+Benchmark: Join Measurements -> Songs.
+
+Vergleicht den alten Join aus get_songs_metadata() (für jedes Measurement
+alle Songs und deren measurements_ids durchsuchen) mit dem indexbasierten
+Join aus notion_store.join_measurements().
+
+Aufruf aus dem Repo-Root:  python benchmarks/join_benchmark.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from notion_store import join_measurements
+
+SIZES = [(1000, 10000), (2000, 20000), (10000, 100000)]
+# Der alte Join wird oberhalb dieser Größe nur noch hochgerechnet (quadratisch)
+NAIVE_LIMIT = 2000
+
+
+def make_data(n_songs, n_measurements):
+    metadata = {}
+    measurements = []
+    for i in range(n_songs):
+        metadata[f"track{i}"] = {"page_id": f"page{i}", "measurements_ids": [], "measurements": []}
+    for j in range(n_measurements):
+        song = metadata[f"track{j % n_songs}"]
+        m_id = f"m{j}"
+        song["measurements_ids"].append(m_id)
+        measurements.append((song["page_id"], {"id": m_id, "timestamp": "", "streams": j}))
+    return metadata, measurements
+
+
+def naive_join(metadata, measurements):
+    for _, measurement in measurements:
+        for key, song_data in metadata.items():
+            if measurement["id"] in song_data.get("measurements_ids", []):
+                song_data["measurements"].append(measurement)
+    return metadata
+
+
+def indexed_join(metadata, measurements):
+    measurement_index = {}
+    page_index = {}
+    for key, song in metadata.items():
+        page_index[song["page_id"]] = key
+        for m_id in song["measurements_ids"]:
+            measurement_index[m_id] = key
+    return join_measurements(metadata, measurement_index, page_index, measurements)
+
+
+def timed(fn, n_songs, n_measurements):
+    metadata, measurements = make_data(n_songs, n_measurements)
+    start = time.perf_counter()
+    fn(metadata, measurements)
+    return time.perf_counter() - start
+
+
+def main():
+    print(f"{'Songs':>8} {'Measurements':>13} {'alt (s)':>12} {'Index (s)':>10}")
+    naive_reference = None
+    for n_songs, n_measurements in SIZES:
+        indexed = timed(indexed_join, n_songs, n_measurements)
+        if n_songs <= NAIVE_LIMIT:
+            naive = timed(naive_join, n_songs, n_measurements)
+            naive_reference = (n_songs, n_measurements, naive)
+            naive_text = f"{naive:12.3f}"
+        else:
+            ref_songs, ref_measurements, ref_time = naive_reference
+            factor = (n_songs / ref_songs) * (n_measurements / ref_measurements)
+            naive_text = f"~{ref_time * factor:11.0f}"
+        print(f"{n_songs:>8} {n_measurements:>13} {naive_text} {indexed:10.3f}")
+
+
+if __name__ == "__main__":
+    main()
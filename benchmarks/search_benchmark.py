@@ -0,0 +1,58 @@
+"""
+Benchmark: Suchindex über Track- und Artist-Namen.
+
+Baut einen Index über synthetische Songs auf und misst typische Anfragen
+(Teilstring, Präfix, kurze Anfrage, Tippfehler) mit limit=50.
+
+Aufruf aus dem Repo-Root:  python benchmarks/search_benchmark.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from search_index import SearchIndex
+
+SONGS = 100000
+QUERIES = ["lieb", "Beyoncé", "the", "mo", "l", "zeitlos", "beyonse", "nacht musik"]
+SYLLABLES = ["ka", "lo", "mi", "ne", "ra", "to", "sch", "ber", "lie", "nacht", "mu", "sik", "zeit", "los",
+             "ö", "é", "the", "son", "ny", "moon", "ar", "da"]
+
+
+def make_metadata(n):
+    rng = random.Random(42)
+
+    def name(words):
+        return " ".join("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 4))) for _ in range(words))
+
+    metadata = {f"track{i}": {"track_name": name(rng.randint(1, 4)), "artist_name": name(rng.randint(1, 2))}
+                for i in range(n)}
+    metadata["track0"]["artist_name"] = "Beyoncé"
+    return metadata
+
+
+def main():
+    metadata = make_metadata(SONGS)
+    index = SearchIndex()
+    start = time.perf_counter()
+    index.sync(metadata)
+    print(f"Aufbau für {SONGS} Songs: {time.perf_counter() - start:.2f}s")
+    metadata["track1"]["track_name"] = "Neuer Titel"
+    start = time.perf_counter()
+    updated, removed = index.sync(metadata)
+    print(f"Inkrementeller Sync ({updated} geändert): {1000 * (time.perf_counter() - start):.1f}ms")
+    print(f"{'Anfrage':>14} {'Treffer':>8} {'ms (Top 50)':>12}")
+    for query in QUERIES:
+        index.search(query, limit=50)
+        runs = 20
+        start = time.perf_counter()
+        for _ in range(runs):
+            keys = index.search(query, limit=50)
+        elapsed = 1000 * (time.perf_counter() - start) / runs
+        print(f"{query:>14} {len(keys):>8} {elapsed:12.3f}")
+
+
+if __name__ == "__main__":
+    main()
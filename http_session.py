@@ -0,0 +1,177 @@
+"""
+Gemeinsame HTTP-Sessions für Notion, Spotify und Deezer.
+
+Pro Host gibt es eine `requests.Session` mit eigenem Connection-Pool, damit
+Verbindungen (inkl. TLS-Handshake) wiederverwendet werden. Anzahl der Calls,
+Fehler und Latenzen werden pro Host mitgezählt.
+
+Wie viele Requests pro Host gleichzeitig laufen, regelt ein AIMD-Limiter:
+Bei gesunden Antworten steigt das Limit langsam bis zur Poolgröße, bei 429,
+5xx, Verbindungsfehlern oder stark steigender Latenz wird es halbiert
+(Retry-After pausiert den Host zusätzlich). Halbiert wird höchstens einmal pro
+Fenster: Überlastsignale von Requests, die vor der letzten Halbierung gestartet
+sind, gehören zur selben Überlast und werden ignoriert.
+"""
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Poolgröße pro Host, passend zur Parallelität der jeweiligen Aufrufer
+POOL_SIZES = {
+    "api.notion.com": 3,
+    "api.spotify.com": 16,
+    "api-partner.spotify.com": 16,
+    "open.spotify.com": 8,
+    "api.deezer.com": 8
+}
+DEFAULT_POOL_SIZE = 10
+DEFAULT_TIMEOUT = 30
+# Latenz über dem Vielfachen der besten gleitenden Latenz gilt als Überlast
+LATENCY_FACTOR = 3
+BACKOFF_STATUS = {429, 500, 502, 503, 504}
+
+_sessions = {}
+_stats = {}
+_limiters = {}
+_lock = threading.Lock()
+
+
+class AdaptiveLimiter:
+    """AIMD-Begrenzung gleichzeitiger Requests für einen Host."""
+
+    def __init__(self, maximum, initial=None, minimum=1):
+        self.maximum = maximum
+        self.minimum = minimum
+        self.limit = float(initial or max(minimum, maximum // 2))
+        self.in_flight = 0
+        self._paused_until = 0.0
+        self._latency = None
+        self._best_latency = None
+        # Zählt die Halbierungen; jeder Request merkt sich den Stand bei seinem Start
+        self._epoch = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """Wartet auf einen freien Platz und liefert die aktuelle Epoche für release()."""
+        with self._cond:
+            while True:
+                wait = self._paused_until - time.monotonic()
+                if wait > 0:
+                    self._cond.wait(wait)
+                elif self.in_flight >= int(self.limit):
+                    self._cond.wait()
+                else:
+                    self.in_flight += 1
+                    return self._epoch
+
+    def release(self, elapsed, overloaded=False, retry_after=None, epoch=None):
+        with self._cond:
+            self.in_flight -= 1
+            self._latency = elapsed if self._latency is None else 0.8 * self._latency + 0.2 * elapsed
+            # Die Referenz driftet langsam nach oben, damit sich ein dauerhaft langsamerer Host wieder einpendelt
+            self._best_latency = min(1.01 * (self._best_latency or self._latency), self._latency)
+            if retry_after:
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+            if overloaded or self._latency > LATENCY_FACTOR * self._best_latency:
+                # Vor der letzten Halbierung gestartete Requests haben die Überlast schon gemeldet
+                if epoch is None or epoch == self._epoch:
+                    self.limit = max(self.minimum, self.limit / 2)
+                    self._epoch += 1
+                    # Nach dem Backoff den Latenz-Vergleich neu beginnen
+                    self._latency = self._best_latency
+            else:
+                # Additiv: ungefähr +1 pro voll ausgeschöpftem Limit
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+
+def get_limiter(host):
+    with _lock:
+        limiter = _limiters.get(host)
+        if limiter is None:
+            limiter = _limiters[host] = AdaptiveLimiter(POOL_SIZES.get(host, DEFAULT_POOL_SIZE))
+        return limiter
+
+
+def _retry_after(resp):
+    try:
+        return float(resp.headers.get("Retry-After") or 0)
+    except ValueError:
+        return 0
+
+
+def get_session(host):
+    with _lock:
+        session = _sessions.get(host)
+        if session is None:
+            pool_size = POOL_SIZES.get(host, DEFAULT_POOL_SIZE)
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[host] = session
+        return session
+
+
+def _record(host, elapsed, error):
+    with _lock:
+        entry = _stats.setdefault(host, {"calls": 0, "errors": 0, "total_time": 0.0, "max_time": 0.0})
+        entry["calls"] += 1
+        entry["errors"] += int(error)
+        entry["total_time"] += elapsed
+        entry["max_time"] = max(entry["max_time"], elapsed)
+
+
+def request(method, url, **kwargs):
+    host = urlsplit(url).hostname
+    kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+    limiter = get_limiter(host)
+    epoch = limiter.acquire()
+    start = time.perf_counter()
+    try:
+        resp = get_session(host).request(method, url, **kwargs)
+    except requests.RequestException:
+        elapsed = time.perf_counter() - start
+        limiter.release(elapsed, overloaded=True, epoch=epoch)
+        _record(host, elapsed, True)
+        raise
+    elapsed = time.perf_counter() - start
+    limiter.release(elapsed, resp.status_code in BACKOFF_STATUS, _retry_after(resp), epoch)
+    _record(host, elapsed, resp.status_code >= 400)
+    return resp
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
+
+
+def patch(url, **kwargs):
+    return request("PATCH", url, **kwargs)
+
+
+def host_stats():
+    """Calls, Fehler, Latenzen (ms) und aktuelles Parallelitäts-Limit pro Host seit Prozessstart."""
+    with _lock:
+        return {
+            host: {
+                "calls": entry["calls"],
+                "errors": entry["errors"],
+                "avg_ms": round(1000 * entry["total_time"] / entry["calls"], 1) if entry["calls"] else 0.0,
+                "max_ms": round(1000 * entry["max_time"], 1),
+                "limit": int(_limiters[host].limit) if host in _limiters else None
+            }
+            for host, entry in _stats.items()
+        }
+
+
+def host_limits():
+    """Aktuelles Limit und laufende Requests pro Host."""
+    with _lock:
+        return {host: {"limit": int(l.limit), "max": l.maximum, "in_flight": l.in_flight} for host, l in _limiters.items()}
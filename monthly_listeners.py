@@ -0,0 +1,112 @@
+"""
+Monatliche Hörer eines Artists von open.spotify.com.
+
+Die Artist-Seite wird gestreamt und nur so weit gelesen, bis das
+"Hörer monatlich"-Muster gefunden ist. Der letzte Wert pro Artist wird samt
+Zeitstempel in einer SQLite-Datei zwischengespeichert.
+"""
+import codecs
+import re
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+import requests
+
+import http_session
+
+LISTENERS_PATTERN = re.compile(r'([\d\.,]+)\s*(?:Hörer monatlich|monatliche Hörer)', re.IGNORECASE)
+CHUNK_SIZE = 16 * 1024
+# Zeichen, die vom vorherigen Chunk behalten werden, damit ein Treffer über eine Chunk-Grenze nicht verloren geht
+OVERLAP = 200
+CACHE_FILE = "monthly_listeners.sqlite"
+DEFAULT_MAX_AGE = 6 * 3600
+
+stats = {"hits": 0, "misses": 0, "parse_failures": 0, "http_errors": 0, "bytes_read": 0}
+_lock = threading.Lock()
+
+
+def _count(key, amount=1):
+    with _lock:
+        stats[key] += amount
+
+
+def get_stats():
+    with _lock:
+        return dict(stats)
+
+
+def parse_listeners(text):
+    match = LISTENERS_PATTERN.search(text)
+    if not match:
+        return None
+    try:
+        return int(match.group(1).replace('.', '').replace(',', ''))
+    except ValueError:
+        return None
+
+
+def scrape_monthly_listeners(artist_id):
+    """Liest die Artist-Seite chunkweise und bricht beim ersten Treffer ab (None, wenn nichts gefunden)."""
+    url = f"https://open.spotify.com/artist/{artist_id}"
+    headers = {"User-Agent": "Mozilla/5.0", "Accept-Language": "de"}
+    with http_session.get(url, headers=headers, stream=True) as r:
+        if r.status_code != 200:
+            _count("http_errors")
+            return None
+        decoder = codecs.getincrementaldecoder(r.encoding or "utf-8")(errors="replace")
+        window = ""
+        for chunk in r.iter_content(CHUNK_SIZE):
+            _count("bytes_read", len(chunk))
+            window = window[-OVERLAP:] + decoder.decode(chunk)
+            value = parse_listeners(window)
+            if value is not None:
+                return value
+    _count("parse_failures")
+    return None
+
+
+#############################
+# Persistenter Cache
+#############################
+def _connect(path):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE IF NOT EXISTS listeners (artist_id TEXT PRIMARY KEY, value INTEGER, fetched_at REAL)")
+    return conn
+
+
+def load_cached(artist_id, path=CACHE_FILE):
+    with _lock, closing(_connect(path)) as conn:
+        row = conn.execute("SELECT value, fetched_at FROM listeners WHERE artist_id = ?", (artist_id,)).fetchone()
+    return row
+
+
+def store_cached(artist_id, value, path=CACHE_FILE):
+    with _lock, closing(_connect(path)) as conn, conn:
+        conn.execute("INSERT OR REPLACE INTO listeners (artist_id, value, fetched_at) VALUES (?, ?, ?)",
+                     (artist_id, value, time.time()))
+
+
+def get_monthly_listeners(artist_id, max_age=DEFAULT_MAX_AGE, path=CACHE_FILE):
+    """
+    Liefert die monatlichen Hörer aus dem Cache, solange der Wert jünger als
+    `max_age` Sekunden ist, sonst frisch gescrapt. Schlägt das Scrapen fehl,
+    wird der letzte bekannte Wert zurückgegeben (oder None).
+    """
+    if not artist_id:
+        return None
+    cached = load_cached(artist_id, path)
+    if cached and time.time() - cached[1] <= max_age:
+        _count("hits")
+        return cached[0]
+    _count("misses")
+    try:
+        value = scrape_monthly_listeners(artist_id)
+    except requests.RequestException:
+        _count("http_errors")
+        value = None
+    if value is None:
+        return cached[0] if cached else None
+    store_cached(artist_id, value, path)
+    return value
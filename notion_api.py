@@ -0,0 +1,148 @@
+"""
+Gemeinsamer, ratenbegrenzter Notion-Client für alle Seiten.
+
+Notion erlaubt im Schnitt ca. 3 Requests pro Sekunde und Integration. Alle
+Aufrufe (Query, Page GET, Create, PATCH) laufen deshalb über einen Token-Bucket,
+eine begrenzte Anzahl gleichzeitiger Requests und die gepoolte Session aus
+http_session. Der Client betreibt seine eigene asyncio-Eventloop in einem Hintergrund-Thread,
+damit der synchrone Streamlit-Code ihn per `run()` nutzen kann.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import http_session
+
+NOTION_API = "https://api.notion.com/v1"
+NOTION_VERSION = "2022-06-28"
+# 409 (conflict_error) ist laut Notion ebenfalls wiederholbar
+RETRY_STATUS = {409, 429, 500, 502, 503, 504}
+# Creates sind nicht idempotent: nach 5xx kann die Seite trotzdem angelegt worden sein,
+# nur 429 (abgewiesen, bevor etwas passiert ist) wird wiederholt
+CREATE_RETRY_STATUS = {429}
+
+
+class TokenBucket:
+    """Token-Bucket mit `rate` Tokens pro Sekunde und Burst bis `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds):
+        """Hält alle Wartenden an, z.B. nach einem 429 mit Retry-After."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class NotionClient:
+    def __init__(self, secret, rate=3, burst=3, max_concurrency=3, max_retries=5, timeout=30):
+        self.headers = {
+            "Authorization": f"Bearer {secret}",
+            "Content-Type": "application/json",
+            "Notion-Version": NOTION_VERSION
+        }
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="notion")
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, daemon=True, name="notion-loop").start()
+        self._bucket = TokenBucket(rate, burst)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    #############################
+    # Synchrone Brücke
+    #############################
+    def run(self, coro):
+        """Führt eine Coroutine auf der Client-Loop aus und wartet auf das Ergebnis."""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def run_all(self, coros, return_exceptions=False):
+        """Führt mehrere Coroutinen gleichzeitig aus (Reihenfolge der Ergebnisse bleibt erhalten)."""
+        async def gather():
+            return await asyncio.gather(*coros, return_exceptions=return_exceptions)
+        return self.run(gather())
+
+    #############################
+    # Requests
+    #############################
+    async def request(self, method, path, payload=None, retry_status=RETRY_STATUS):
+        url = f"{NOTION_API}/{path}"
+        delay = 1
+        for attempt in range(self.max_retries + 1):
+            async with self._semaphore:
+                await self._bucket.acquire()
+                resp = await self._loop.run_in_executor(
+                    self._executor,
+                    partial(http_session.request, method, url, headers=self.headers, json=payload, timeout=self.timeout)
+                )
+            if resp.status_code not in retry_status or attempt == self.max_retries:
+                resp.raise_for_status()
+                return resp.json()
+            retry_after = resp.headers.get("Retry-After")
+            wait = float(retry_after) if retry_after else delay
+            if resp.status_code == 429:
+                self._bucket.pause(wait)
+            await asyncio.sleep(wait)
+            delay = min(delay * 2, 30)
+
+    async def query(self, database_id, filter=None, sorts=None):
+        """Paginierte Datenbank-Abfrage, liefert alle passenden Seiten."""
+        payload = {"page_size": 100}
+        if filter:
+            payload["filter"] = filter
+        if sorts:
+            payload["sorts"] = sorts
+        pages = []
+        while True:
+            data = await self.request("POST", f"databases/{database_id}/query", payload)
+            pages.extend(data.get("results", []))
+            if not data.get("has_more"):
+                return pages
+            payload["start_cursor"] = data.get("next_cursor")
+
+    async def get_page(self, page_id):
+        return await self.request("GET", f"pages/{page_id}")
+
+    async def create_page(self, database_id, properties):
+        return await self.request("POST", "pages", {"parent": {"database_id": database_id}, "properties": properties},
+                                  retry_status=CREATE_RETRY_STATUS)
+
+    async def update_page(self, page_id, properties=None, archived=None):
+        payload = {}
+        if properties is not None:
+            payload["properties"] = properties
+        if archived is not None:
+            payload["archived"] = archived
+        return await self.request("PATCH", f"pages/{page_id}", payload)
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(secret):
+    """Prozessweiter Client pro Integration, damit sich alle Seiten ein Limit teilen."""
+    with _clients_lock:
+        if secret not in _clients:
+            _clients[secret] = NotionClient(secret)
+        return _clients[secret]
@@ -0,0 +1,591 @@
+"""
+Lokaler SQLite-Spiegel der Notion-Datenbanken (Songs & Measurements).
+
+Nach dem ersten vollständigen Abgleich werden nur noch Seiten geholt, deren
+`last_edited_time` seit dem letzten Sync neuer ist. Die Songs werden zusätzlich
+regelmäßig vollständig abgeglichen, da archivierte oder gelöschte Seiten in
+inkrementellen Abfragen nicht auftauchen.
+"""
+import datetime
+import itertools
+import json
+import sqlite3
+
+STORE_FILE = "notion_mirror.sqlite"
+# Abstand der vollständigen Songs-Abgleiche in Stunden
+FULL_SYNC_HOURS = 24
+MEASUREMENT_FIELDS = ["song_pop", "artist_pop", "streams", "monthly_listeners", "artist_followers"]
+# Notion-Property je Measurement-Feld; in der Rollup-Datenbank z.B. "Streams Min", "Streams Max", "Streams Last"
+MEASUREMENT_PROPERTIES = {
+    "song_pop": "Song Pop",
+    "artist_pop": "Artist Pop",
+    "streams": "Streams",
+    "monthly_listeners": "Monthly Listeners",
+    "artist_followers": "Artist Followers"
+}
+ROLLUP_STATS = ["min", "max", "last"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS songs (
+    page_id TEXT PRIMARY KEY,
+    track_name TEXT,
+    artist_name TEXT,
+    artist_id TEXT,
+    track_id TEXT,
+    release_date TEXT,
+    country_code TEXT,
+    last_edited TEXT,
+    favourite INTEGER,
+    measurements_ids TEXT
+);
+CREATE TABLE IF NOT EXISTS measurements (
+    id TEXT PRIMARY KEY,
+    song_page_id TEXT,
+    timestamp TEXT,
+    song_pop INTEGER,
+    artist_pop INTEGER,
+    streams INTEGER,
+    monthly_listeners INTEGER,
+    artist_followers INTEGER
+);
+CREATE INDEX IF NOT EXISTS measurements_song ON measurements (song_page_id);
+CREATE TABLE IF NOT EXISTS track_assets (
+    track_id TEXT PRIMARY KEY,
+    cover_url TEXT,
+    track_url TEXT
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    database_id TEXT PRIMARY KEY,
+    cursor TEXT
+);
+CREATE TABLE IF NOT EXISTS rollups (
+    song_page_id TEXT,
+    granularity TEXT,
+    bucket TEXT,
+    count INTEGER,
+    timestamp TEXT,
+    %s,
+    PRIMARY KEY (song_page_id, granularity, bucket)
+);
+CREATE TABLE IF NOT EXISTS compacted (
+    id TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS rollup_pages (
+    song_page_id TEXT,
+    granularity TEXT,
+    bucket TEXT,
+    page_id TEXT,
+    dirty INTEGER,
+    PRIMARY KEY (song_page_id, granularity, bucket)
+);
+CREATE TABLE IF NOT EXISTS archive_queue (
+    id TEXT PRIMARY KEY,
+    kind TEXT
+);
+""" % ",\n    ".join(f"{field}_{stat} INTEGER" for field in MEASUREMENT_FIELDS for stat in ROLLUP_STATS)
+
+
+def open_store(path):
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+    return conn
+
+
+#############################
+# Notion-Seiten parsen
+#############################
+def _plain_text(prop, kind):
+    if not prop or not prop.get(kind):
+        return ""
+    return "".join([t.get("plain_text", "") for t in prop[kind]]).strip()
+
+
+def parse_song_page(page):
+    props = page.get("properties", {})
+    release_date = ""
+    if "Release Date" in props and props["Release Date"].get("date"):
+        release_date = props["Release Date"]["date"].get("start", "")
+    favourite = False
+    if "Favourite" in props:
+        favourite = props["Favourite"].get("checkbox", False)
+    measurements_ids = []
+    if "Measurements" in props and props["Measurements"].get("relation"):
+        measurements_ids = [rel.get("id") for rel in props["Measurements"]["relation"] if rel.get("id")]
+    return {
+        "page_id": page.get("id"),
+        "track_name": _plain_text(props.get("Track Name"), "title"),
+        "artist_name": _plain_text(props.get("Artist Name"), "rich_text"),
+        "artist_id": _plain_text(props.get("Artist ID"), "rich_text"),
+        "track_id": _plain_text(props.get("Track ID"), "rich_text"),
+        "release_date": release_date,
+        "country_code": _plain_text(props.get("Country Code"), "rich_text"),
+        "last_edited": page.get("last_edited_time", ""),
+        "favourite": favourite,
+        "measurements_ids": measurements_ids
+    }
+
+
+def parse_measurement_page(page):
+    props = page.get("properties", {})
+    return {
+        "timestamp": page.get("created_time", ""),
+        "song_pop": int(props.get("Song Pop", {}).get("number") or 0),
+        "artist_pop": int(props.get("Artist Pop", {}).get("number") or 0),
+        "streams": int(props.get("Streams", {}).get("number") or 0),
+        "monthly_listeners": int(props.get("Monthly Listeners", {}).get("number") or 0),
+        "artist_followers": int(props.get("Artist Followers", {}).get("number") or 0)
+    }
+
+
+#############################
+# Sync-Cursor
+#############################
+def get_cursor(conn, database_id):
+    row = conn.execute("SELECT cursor FROM sync_state WHERE database_id = ?", (database_id,)).fetchone()
+    return row["cursor"] if row else None
+
+
+def set_cursor(conn, database_id, cursor):
+    conn.execute(
+        "INSERT INTO sync_state (database_id, cursor) VALUES (?, ?) "
+        "ON CONFLICT(database_id) DO UPDATE SET cursor = excluded.cursor",
+        (database_id, cursor)
+    )
+
+
+def edited_since_filter(cursor):
+    # Notion rundet last_edited_time auf Minuten, daher "on_or_after" statt "after";
+    # doppelt gelieferte Seiten werden per Upsert einfach überschrieben.
+    return {"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": cursor}}
+
+
+#############################
+# Songs & Measurements abgleichen
+#############################
+def upsert_song(conn, song):
+    conn.execute(
+        "INSERT OR REPLACE INTO songs (page_id, track_name, artist_name, artist_id, track_id, release_date, "
+        "country_code, last_edited, favourite, measurements_ids) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (song["page_id"], song["track_name"], song["artist_name"], song["artist_id"], song["track_id"],
+         song["release_date"], song["country_code"], song["last_edited"], int(song["favourite"]),
+         json.dumps(song["measurements_ids"]))
+    )
+
+
+def upsert_measurement(conn, measurement_id, song_page_id, details):
+    conn.execute(
+        "INSERT OR REPLACE INTO measurements (id, song_page_id, timestamp, song_pop, artist_pop, streams, "
+        "monthly_listeners, artist_followers) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (measurement_id, song_page_id, details.get("timestamp", ""),
+         *[int(details.get(field) or 0) for field in MEASUREMENT_FIELDS])
+    )
+
+
+def sync_songs(conn, database_id, query_database, full_sync_hours=FULL_SYNC_HOURS, now=None):
+    """
+    Gleicht die Songs-Datenbank ab und liefert die geänderten Songs zurück.
+
+    :param query_database: Funktion (database_id, filter) -> Liste aller passenden Seiten
+    :param full_sync_hours: nach so vielen Stunden wird statt inkrementell wieder vollständig abgeglichen
+    """
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    cursor = get_cursor(conn, database_id)
+    # Zeitpunkt des letzten vollständigen Abgleichs steht unter eigenem Schlüssel in sync_state
+    last_full = get_cursor(conn, f"{database_id}:full")
+    full = cursor is None or last_full is None or \
+        now - datetime.datetime.fromisoformat(last_full) > datetime.timedelta(hours=full_sync_hours)
+    pages = query_database(database_id, None if full else edited_since_filter(cursor))
+    changed = [parse_song_page(page) for page in pages]
+    with conn:
+        if full:
+            # Archivierte Seiten tauchen in inkrementellen Abfragen nicht mehr auf,
+            # beim vollständigen Abgleich wird der Bestand daher ersetzt.
+            conn.execute("DELETE FROM songs")
+            set_cursor(conn, f"{database_id}:full", now.isoformat())
+        for song in changed:
+            upsert_song(conn, song)
+        newest = max([song["last_edited"] for song in changed if song["last_edited"]], default=cursor)
+        if newest:
+            set_cursor(conn, database_id, newest)
+    return changed
+
+
+def load_measurements_bulk(database_id, query_database, filter=None):
+    """
+    Holt Measurements per paginierter Abfrage der Measurements-Datenbank
+    (100 Seiten pro Request) statt einem GET pro Seite und gruppiert sie
+    nach ihrer Song-Relation.
+
+    :return: dict song_page_id -> Liste von {"id", "last_edited", **details}
+    """
+    by_song = {}
+    for page in query_database(database_id, filter):
+        details = {"id": page.get("id"), "last_edited": page.get("last_edited_time", ""), **parse_measurement_page(page)}
+        for rel in page.get("properties", {}).get("Song", {}).get("relation", []):
+            if rel.get("id"):
+                by_song.setdefault(rel["id"], []).append(details)
+    return by_song
+
+
+def sync_measurements(conn, database_id, query_database):
+    """Gleicht die Measurements-Datenbank inkrementell ab, analog zu sync_songs."""
+    cursor = get_cursor(conn, database_id)
+    by_song = load_measurements_bulk(database_id, query_database, None if cursor is None else edited_since_filter(cursor))
+    compacted = {row["id"] for row in conn.execute("SELECT id FROM compacted")}
+    coverage = _rollup_coverage(conn)
+    newest = cursor
+    with conn:
+        for song_page_id, measurements in by_song.items():
+            for details in measurements:
+                # Bereits verdichtete Measurements stecken in den Rollups – auch solche, die
+                # nur über die Rollup-Datenbank bekannt sind (z.B. nach Verlust des Spiegels)
+                if details["id"] in compacted:
+                    pass
+                elif _is_covered(coverage, song_page_id, details["timestamp"]):
+                    conn.execute("INSERT OR IGNORE INTO compacted (id) VALUES (?)", (details["id"],))
+                else:
+                    upsert_measurement(conn, details["id"], song_page_id, details)
+                if details["last_edited"] and (newest is None or details["last_edited"] > newest):
+                    newest = details["last_edited"]
+        if newest:
+            set_cursor(conn, database_id, newest)
+    return by_song
+
+
+def load_artists(conn):
+    """dict artist_id -> Artist-Name aller Songs im Spiegel."""
+    rows = conn.execute("SELECT DISTINCT artist_id, artist_name FROM songs WHERE artist_id != ''")
+    return {row["artist_id"]: row["artist_name"] for row in rows}
+
+
+#############################
+# Cover & Track-Links (nur lokal, nicht in Notion)
+#############################
+def load_track_assets(conn, track_ids=None):
+    """dict track_id -> {"cover_url", "track_url"}; optional nur für die übergebenen IDs."""
+    if track_ids is None:
+        rows = conn.execute("SELECT * FROM track_assets")
+    else:
+        track_ids = list(track_ids)
+        rows = []
+        for i in range(0, len(track_ids), 500):
+            chunk = track_ids[i:i + 500]
+            rows.extend(conn.execute(
+                f"SELECT * FROM track_assets WHERE track_id IN ({','.join('?' * len(chunk))})", chunk
+            ))
+    return {row["track_id"]: {"cover_url": row["cover_url"], "track_url": row["track_url"]} for row in rows}
+
+
+def store_track_assets(conn, assets):
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO track_assets (track_id, cover_url, track_url) VALUES (?, ?, ?)",
+            [(track_id, a["cover_url"], a["track_url"]) for track_id, a in assets.items()]
+        )
+
+
+#############################
+# Verdichtung alter Measurements
+#############################
+def _bucket_from_values(timestamp, values):
+    return {
+        "count": 1,
+        "timestamp": timestamp,
+        **{f"{field}_{stat}": values[field] for field in MEASUREMENT_FIELDS for stat in ROLLUP_STATS}
+    }
+
+
+def _merge_buckets(a, b):
+    if a is None:
+        return b
+    first, second = (a, b) if a["timestamp"] <= b["timestamp"] else (b, a)
+    merged = {"count": a["count"] + b["count"], "timestamp": second["timestamp"]}
+    for field in MEASUREMENT_FIELDS:
+        merged[f"{field}_min"] = min(a[f"{field}_min"], b[f"{field}_min"])
+        merged[f"{field}_max"] = max(a[f"{field}_max"], b[f"{field}_max"])
+        merged[f"{field}_last"] = second[f"{field}_last"]
+    return merged
+
+
+def _load_bucket(conn, song_page_id, granularity, bucket):
+    row = conn.execute("SELECT * FROM rollups WHERE song_page_id = ? AND granularity = ? AND bucket = ?",
+                       (song_page_id, granularity, bucket)).fetchone()
+    return dict(row) if row else None
+
+
+def _store_bucket(conn, song_page_id, granularity, bucket, values):
+    columns = ["count", "timestamp"] + [f"{field}_{stat}" for field in MEASUREMENT_FIELDS for stat in ROLLUP_STATS]
+    conn.execute(
+        f"INSERT OR REPLACE INTO rollups (song_page_id, granularity, bucket, {', '.join(columns)}) "
+        f"VALUES (?, ?, ?, {', '.join('?' * len(columns))})",
+        (song_page_id, granularity, bucket, *[values[c] for c in columns])
+    )
+
+
+def _week_start(day):
+    date = datetime.date.fromisoformat(day)
+    return (date - datetime.timedelta(days=date.weekday())).isoformat()
+
+
+def _rollup_coverage(conn):
+    """dict (song_page_id, granularity, bucket) -> Zeitstempel des letzten darin verdichteten Measurements."""
+    return {(row["song_page_id"], row["granularity"], row["bucket"]): row["timestamp"]
+            for row in conn.execute("SELECT song_page_id, granularity, bucket, timestamp FROM rollups")}
+
+
+def _is_covered(coverage, song_page_id, timestamp):
+    """
+    True, wenn ein Roh-Measurement schon in einem Rollup steckt. Verdichtet wird in
+    zeitlicher Reihenfolge, ein Bucket enthält also alle Measurements seines Tags bzw.
+    seiner Woche bis zu seinem Zeitstempel. Verglichen wird sekundengenau, da Notion
+    Zeitstempel mal mit "Z", mal mit "+00:00" liefert.
+    """
+    if not timestamp:
+        return False
+    day = timestamp[:10]
+    for key in ((song_page_id, "day", day), (song_page_id, "week", _week_start(day))):
+        last = coverage.get(key)
+        if last and timestamp[:19] <= last[:19]:
+            return True
+    return False
+
+
+def _mark_dirty(conn, song_page_id, granularity, bucket):
+    # Geänderte Rollups müssen (erneut) in die Rollup-Datenbank in Notion
+    conn.execute(
+        "INSERT INTO rollup_pages (song_page_id, granularity, bucket, dirty) VALUES (?, ?, ?, 1) "
+        "ON CONFLICT(song_page_id, granularity, bucket) DO UPDATE SET dirty = 1",
+        (song_page_id, granularity, bucket)
+    )
+
+
+def compact_measurements(conn, raw_days=7, daily_days=90, now=None, archive_raw=False):
+    """
+    Verdichtet alte Measurements: älter als `raw_days` zu Tages-Buckets, Tages-Buckets
+    älter als `daily_days` zu Wochen-Buckets (jeweils min, max, last und count pro Feld).
+    Damit bleibt die Zahl der Punkte pro Song begrenzt, egal wie lange er schon getrackt wird.
+
+    Geänderte Rollups werden zum Hochladen markiert (dirty_rollups), die Notion-Seiten
+    zusammengefasster Tages-Rollups landen in der Archiv-Warteschlange.
+
+    :param archive_raw: auch die verdichteten Roh-Measurements zum Archivieren vormerken
+    :return: IDs der verdichteten Roh-Measurements
+    """
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    raw_cutoff = (now - datetime.timedelta(days=raw_days)).strftime("%Y-%m-%dT%H:%M:%S")
+    daily_cutoff = (now - datetime.timedelta(days=daily_days)).date().isoformat()
+    compacted_ids = []
+    with conn:
+        rows = conn.execute(
+            "SELECT * FROM measurements WHERE timestamp != '' AND timestamp < ? ORDER BY song_page_id, timestamp",
+            (raw_cutoff,)
+        ).fetchall()
+        for (song_page_id, day), group in itertools.groupby(rows, key=lambda r: (r["song_page_id"], r["timestamp"][:10])):
+            bucket = _load_bucket(conn, song_page_id, "day", day)
+            for row in group:
+                bucket = _merge_buckets(bucket, _bucket_from_values(row["timestamp"], row))
+                compacted_ids.append(row["id"])
+            _store_bucket(conn, song_page_id, "day", day, bucket)
+            _mark_dirty(conn, song_page_id, "day", day)
+        conn.executemany("INSERT OR IGNORE INTO compacted (id) VALUES (?)", [(i,) for i in compacted_ids])
+        conn.executemany("DELETE FROM measurements WHERE id = ?", [(i,) for i in compacted_ids])
+        if archive_raw:
+            conn.executemany("INSERT OR IGNORE INTO archive_queue (id, kind) VALUES (?, 'raw')", [(i,) for i in compacted_ids])
+
+        days = conn.execute(
+            "SELECT * FROM rollups WHERE granularity = 'day' AND bucket < ? ORDER BY song_page_id, bucket",
+            (daily_cutoff,)
+        ).fetchall()
+        for (song_page_id, week), group in itertools.groupby(days, key=lambda r: (r["song_page_id"], _week_start(r["bucket"]))):
+            bucket = _load_bucket(conn, song_page_id, "week", week)
+            for row in group:
+                bucket = _merge_buckets(bucket, dict(row))
+            _store_bucket(conn, song_page_id, "week", week, bucket)
+            _mark_dirty(conn, song_page_id, "week", week)
+        conn.execute("DELETE FROM rollups WHERE granularity = 'day' AND bucket < ?", (daily_cutoff,))
+        # Die Tages-Rollups stecken jetzt im Wochen-Rollup, ihre Notion-Seiten werden archiviert
+        conn.execute(
+            "INSERT OR IGNORE INTO archive_queue (id, kind) SELECT page_id, 'rollup' FROM rollup_pages "
+            "WHERE granularity = 'day' AND bucket < ? AND page_id IS NOT NULL",
+            (daily_cutoff,)
+        )
+        conn.execute("DELETE FROM rollup_pages WHERE granularity = 'day' AND bucket < ?", (daily_cutoff,))
+    return compacted_ids
+
+
+#############################
+# Rollups in Notion
+#############################
+def rollup_properties(row):
+    """Notion-Properties eines Rollups für die Rollup-Datenbank."""
+    properties = {
+        "Name": {"title": [{"text": {"content": f"{row['granularity']} {row['bucket']}"}}]},
+        "Song": {"relation": [{"id": row["song_page_id"]}]},
+        "Granularity": {"select": {"name": row["granularity"]}},
+        "Bucket": {"date": {"start": row["bucket"]}},
+        "Timestamp": {"date": {"start": row["timestamp"]}},
+        "Count": {"number": row["count"]}
+    }
+    for field, label in MEASUREMENT_PROPERTIES.items():
+        for stat in ROLLUP_STATS:
+            properties[f"{label} {stat.capitalize()}"] = {"number": row[f"{field}_{stat}"]}
+    return properties
+
+
+def parse_rollup_page(page):
+    props = page.get("properties", {})
+    songs = props.get("Song", {}).get("relation") or [{}]
+    row = {
+        "song_page_id": songs[0].get("id"),
+        "granularity": (props.get("Granularity", {}).get("select") or {}).get("name", ""),
+        "bucket": (props.get("Bucket", {}).get("date") or {}).get("start", ""),
+        "timestamp": (props.get("Timestamp", {}).get("date") or {}).get("start", ""),
+        "count": int(props.get("Count", {}).get("number") or 0)
+    }
+    for field, label in MEASUREMENT_PROPERTIES.items():
+        for stat in ROLLUP_STATS:
+            row[f"{field}_{stat}"] = int(props.get(f"{label} {stat.capitalize()}", {}).get("number") or 0)
+    return row
+
+
+def dirty_rollups(conn):
+    """Rollups, die noch nicht (oder nicht in der aktuellen Fassung) in Notion stehen, mit ihrer page_id."""
+    return [dict(row) for row in conn.execute(
+        "SELECT r.*, p.page_id FROM rollups r JOIN rollup_pages p "
+        "USING (song_page_id, granularity, bucket) WHERE p.dirty = 1"
+    )]
+
+
+def mark_rollup_synced(conn, row, page_id):
+    conn.execute(
+        "UPDATE rollup_pages SET page_id = ?, dirty = 0 WHERE song_page_id = ? AND granularity = ? AND bucket = ?",
+        (page_id, row["song_page_id"], row["granularity"], row["bucket"])
+    )
+
+
+def sync_rollups(conn, database_id, query_database):
+    """
+    Holt Rollups aus der Rollup-Datenbank in den Spiegel, analog zu sync_measurements;
+    so überlebt die verdichtete Historie den Verlust der lokalen Datei. Lokal noch nicht
+    hochgeladene Änderungen und bereits zusammengefasste Tages-Rollups haben Vorrang;
+    Roh-Measurements, die in einem Rollup stecken, werden aus dem Spiegel entfernt.
+    """
+    cursor = get_cursor(conn, database_id)
+    pages = query_database(database_id, None if cursor is None else edited_since_filter(cursor))
+    queued = {row["id"] for row in conn.execute("SELECT id FROM archive_queue")}
+    newest = cursor
+    with conn:
+        for page in pages:
+            if page.get("last_edited_time") and (newest is None or page["last_edited_time"] > newest):
+                newest = page["last_edited_time"]
+            row = parse_rollup_page(page)
+            if page.get("id") in queued or not (row["song_page_id"] and row["granularity"] and row["bucket"]):
+                continue
+            key = (row["song_page_id"], row["granularity"], row["bucket"])
+            local = conn.execute("SELECT dirty FROM rollup_pages WHERE song_page_id = ? AND granularity = ? AND bucket = ?",
+                                 key).fetchone()
+            if local and local["dirty"]:
+                continue
+            _store_bucket(conn, *key, row)
+            conn.execute("INSERT OR REPLACE INTO rollup_pages (song_page_id, granularity, bucket, page_id, dirty) "
+                         "VALUES (?, ?, ?, ?, 0)", (*key, page.get("id")))
+        # Schon importierte Roh-Measurements, die in den geholten Rollups stecken, nicht doppelt zählen
+        coverage = _rollup_coverage(conn)
+        covered = [row["id"] for row in conn.execute("SELECT id, song_page_id, timestamp FROM measurements")
+                   if _is_covered(coverage, row["song_page_id"], row["timestamp"])]
+        conn.executemany("INSERT OR IGNORE INTO compacted (id) VALUES (?)", [(i,) for i in covered])
+        conn.executemany("DELETE FROM measurements WHERE id = ?", [(i,) for i in covered])
+        if newest:
+            set_cursor(conn, database_id, newest)
+
+
+def queued_archives(conn, kinds):
+    """IDs der Notion-Seiten in der Archiv-Warteschlange, nur der angegebenen Arten ("raw", "rollup")."""
+    return [row["id"] for row in conn.execute(
+        f"SELECT id FROM archive_queue WHERE kind IN ({','.join('?' * len(kinds))})", list(kinds)
+    )]
+
+
+def dequeue_archived(conn, ids):
+    with conn:
+        conn.executemany("DELETE FROM archive_queue WHERE id = ?", [(i,) for i in ids])
+
+
+def _rollup_measurement(row):
+    """Rollup als Measurement-Punkt: die letzten Werte des Buckets, dazu min/max/count."""
+    return {
+        "id": f"{row['granularity']}:{row['bucket']}",
+        "timestamp": row["timestamp"],
+        **{field: row[f"{field}_last"] for field in MEASUREMENT_FIELDS},
+        "rollup": {
+            "granularity": row["granularity"],
+            "bucket": row["bucket"],
+            "count": row["count"],
+            "min": {field: row[f"{field}_min"] for field in MEASUREMENT_FIELDS},
+            "max": {field: row[f"{field}_max"] for field in MEASUREMENT_FIELDS}
+        }
+    }
+
+
+#############################
+# Metadaten aus dem Spiegel laden
+#############################
+def join_measurements(metadata, measurement_index, page_index, measurements):
+    """
+    Hängt Measurements in einem einzigen linearen Durchlauf an ihre Songs.
+
+    :param measurement_index: dict measurement_id -> Song-Key (aus der Measurements-Relation der Songs)
+    :param page_index: dict song_page_id -> Song-Key (Fallback über die Song-Relation des Measurements)
+    :param measurements: Iterable von (song_page_id, measurement)
+    """
+    for song_page_id, measurement in measurements:
+        key = measurement_index.get(measurement["id"]) or page_index.get(song_page_id)
+        if key is not None:
+            metadata[key]["measurements"].append(measurement)
+    return metadata
+
+
+def load_metadata(conn):
+    metadata = {}
+    measurement_index = {}
+    page_index = {}
+    for row in conn.execute("SELECT * FROM songs"):
+        song = {
+            "page_id": row["page_id"],
+            "track_name": row["track_name"],
+            "artist_name": row["artist_name"],
+            "artist_id": row["artist_id"],
+            "track_id": row["track_id"],
+            "release_date": row["release_date"],
+            "country_code": row["country_code"],
+            "last_edited": row["last_edited"],
+            "favourite": bool(row["favourite"]),
+            "measurements_ids": json.loads(row["measurements_ids"] or "[]"),
+            "measurements": []
+        }
+        key = song["track_id"] if song["track_id"] else song["page_id"]
+        metadata[key] = song
+        # Join-Index direkt beim Einlesen aufbauen
+        page_index[song["page_id"]] = key
+        for m_id in song["measurements_ids"]:
+            measurement_index[m_id] = key
+    # Rollups sind immer älter als die verbliebenen Roh-Measurements und kommen daher zuerst
+    rollups = (
+        (row["song_page_id"], _rollup_measurement(row))
+        for row in conn.execute("SELECT * FROM rollups ORDER BY timestamp")
+    )
+    rows = conn.execute("SELECT * FROM measurements ORDER BY timestamp")
+    measurements = itertools.chain(rollups, (
+        (row["song_page_id"], {"id": row["id"], "timestamp": row["timestamp"], **{field: row[field] for field in MEASUREMENT_FIELDS}})
+        for row in rows
+    ))
+    join_measurements(metadata, measurement_index, page_index, measurements)
+    for song in metadata.values():
+        # Measurements sind nach Zeitstempel sortiert, das letzte ist der aktuelle Stand
+        if song["measurements"]:
+            song["latest_measurement"] = song["measurements"][-1]
+    for track_id, assets in load_track_assets(conn).items():
+        if track_id in metadata:
+            metadata[track_id].update(assets)
+    return metadata
@@ -3,9 +3,14 @@ playlist scanner
 """
 # page_title: playlist scanner
 import streamlit as st
-import requests, json, time, hashlib
+import requests, hashlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from utils import set_background, set_dark_mode
+from spotify_api import fetch_tracks, get_playcount_cache
+from contextlib import closing
+from notion_store import STORE_FILE, load_artists, open_store
+from playlists import ALL_PLAYLISTS, get_playlist, search_placements, watchlist_report
 
 st.set_page_config(layout="wide")
 set_dark_mode()
@@ -40,88 +45,43 @@ st.markdown(
 def format_number(n):
     return format(n, ",").replace(",", ".")
 
-def get_spotify_token():
-    response = requests.get("https://open.spotify.com/get_access_token?reason=transport&productType=web_player").json()
-    return response["accessToken"]
-
-def get_playlist_data(playlist_id, token):
-    headers = {"Authorization": f"Bearer {token}"}
-    url = f"https://api.spotify.com/v1/playlists/{playlist_id}"
-    response = requests.get(url, headers=headers)
-    return response.json()
-
-def get_deezer_playlist_data(playlist_id):
-    url = f"https://api.deezer.com/playlist/{playlist_id}"
-    response = requests.get(url)
-    return response.json()
-
-def get_spotify_playcount(track_id, token):
-    variables = json.dumps({"uri": f"spotify:track:{track_id}"})
-    extensions = json.dumps({
-        "persistedQuery": {
-            "version": 1,
-            "sha256Hash": "26cd58ab86ebba80196c41c3d48a4324c619e9a9d7df26ecca22417e0c50c6a4"
-        }
-    })
-    params = {"operationName": "getTrack", "variables": variables, "extensions": extensions}
-    response = requests.get("https://api-partner.spotify.com/pathfinder/v1/query",
-                            headers={"Authorization": f"Bearer {SPOTIFY_HEADERS['Authorization'].split()[1]}"}, params=params)
-    response.raise_for_status()
-    return int(response.json()["data"]["trackUnion"].get("playcount", 0))
-
-def get_track_additional_info(track_id, token):
-    headers = {"Authorization": f"Bearer {token}"}
-    url = f"https://api.spotify.com/v1/tracks/{track_id}"
-    data = requests.get(url, headers=headers).json()
-    playcount = get_spotify_playcount(track_id, token)
-    release_date = data.get("album", {}).get("release_date", "N/A")
-    cover_url = data.get("album", {}).get("images", [{}])[0].get("url", "")
-    return {"playcount": playcount, "release_date": release_date, "cover_url": cover_url}
-
-def find_tracks_by_artist(playlist_id, query, token):
-    query = query.strip()
-    headers = {"Authorization": f"Bearer {token}"}
-    url = f"https://api.spotify.com/v1/playlists/{playlist_id}/tracks"
-    params = {"limit": 100}
-    tracks_data = requests.get(url, headers=headers, params=params).json()
-    matches = []
-    for index, item in enumerate(tracks_data.get("items", []), start=1):
-        track = item.get("track")
-        if track and (query.lower() in track['name'].lower() or any(query.lower() in artist['name'].lower() for artist in track['artists'])):
-            extra = get_track_additional_info(track.get("id"), token)
-            track["streams"] = extra.get("playcount")
-            track["release_date"] = extra.get("release_date")
-            track["cover_url"] = extra.get("cover_url")
-            matches.append({"track": track, "position": index})
-    return matches
-
-def normalize_deezer_track(track):
-    normalized = {}
-    normalized["name"] = track.get("title", "Unknown Title")
-    artist_obj = track.get("artist", {})
-    normalized["artists"] = [{
-        "name": artist_obj.get("name", "Unknown Artist"),
-        "id": str(artist_obj.get("id", ""))
-    }]
-    cover_url = track.get("album", {}).get("cover")
-    normalized["album"] = {"images": [{"url": cover_url}]} if cover_url else {"images": []}
-    normalized["streams"] = track.get("rank", 0)
-    normalized["popularity"] = 0
-    normalized["release_date"] = "N/A"
-    normalized["platform"] = "Deezer"
-    normalized["id"] = str(track.get("id"))
-    return normalized
+def enrich_matches(placements):
+    """
+    Ergänzt Spotify-Treffer um Streams, Release und Cover – nach dem Matching und pro
+    Track nur einmal, auch wenn er in mehreren Playlists steht. Release & Cover stecken
+    meist schon im gecachten Playlist-Track, sonst kommen sie gebündelt über den
+    Tracks-Endpoint; Streams laufen parallel über den gemeinsamen Streams-Cache.
+    """
+    spotify_matches = [match for (platform, _), matches in placements.items() if platform == "spotify" for match in matches]
+    track_ids = list(dict.fromkeys(match["track"].get("id") for match in spotify_matches))
+    if not track_ids:
+        return
+    missing_album = {m["track"].get("id") for m in spotify_matches if not m["track"].get("album", {}).get("release_date")}
+    try:
+        tracks = fetch_tracks(missing_album)
+    except requests.RequestException:
+        tracks = {}
+    albums = {m["track"].get("id"): tracks.get(m["track"].get("id"), m["track"]).get("album", {}).get("id") for m in spotify_matches}
+    playcounts = get_playcount_cache().resolve(track_ids, albums)
+    for match in spotify_matches:
+        track = match["track"]
+        album = tracks.get(track.get("id"), track).get("album", {})
+        track["streams"] = playcounts.get(track.get("id"))
+        track["release_date"] = album.get("release_date", "N/A")
+        track["cover_url"] = (album.get("images") or [{}])[0].get("url", "")
 
-def find_tracks_by_artist_deezer(playlist_id, query):
-    url = f"https://api.deezer.com/playlist/{playlist_id}/tracks"
-    params = {"limit": 100}
-    data = requests.get(url, params=params).json()
-    matches = []
-    for index, track in enumerate(data.get("data", []), start=1):
-        if track and 'artist' in track and (query.lower() in track.get("title", "").lower() or query.lower() in track['artist']['name'].lower()):
-            normalized_track = normalize_deezer_track(track)
-            matches.append({"track": normalized_track, "position": index})
-    return matches
+def scan_playlist(pid, platform):
+    """
+    Hält eine Playlist samt Suchindex aktuell (über den Cache) und liefert ihre Metadaten;
+    None, wenn die Playlist nicht geladen werden kann.
+    """
+    playlist = get_playlist(pid, platform)
+    if not playlist:
+        return None
+    scan = {key: playlist[key] for key in ("name", "followers", "owner", "description", "cover", "url", "platform")}
+    if isinstance(scan["followers"], int):
+        scan["followers"] = format_number(scan["followers"])
+    return scan
 
 def generate_track_key(track):
     track_name = track.get("name", "").strip().lower()
@@ -146,27 +106,44 @@ st.markdown(
         """, unsafe_allow_html=True
     )
 
+# --- Watchlist: viele Artists in einem Durchlauf ---
+with st.expander("watchlist", expanded=False):
+    with st.form("watchlist_form"):
+        watchlist_text = st.text_area("artist names or IDs (one per line):", value="")
+        use_tracked = st.checkbox("all artists from Rising Artists", value=False)
+        watchlist_submit = st.form_submit_button("📋 scan watchlist")
+    if watchlist_submit:
+        labels = {line.strip(): line.strip() for line in watchlist_text.splitlines() if line.strip()}
+        if use_tracked:
+            with closing(open_store(STORE_FILE)) as conn:
+                labels.update(load_artists(conn))
+        if labels:
+            with st.spinner(f"Scanning {len(ALL_PLAYLISTS)} playlists for {len(labels)} artists..."):
+                report = watchlist_report(list(labels), names=labels)
+            placed = sorted(((entry, hits) for entry, hits in report.items() if hits), key=lambda item: -len(item[1]))
+            st.markdown(f"<div class='custom-summary'>{len(placed)} of {len(labels)} artists are placed in the scanned playlists.</div>", unsafe_allow_html=True)
+            for entry, hits in placed:
+                playlist_count = len({(h["playlist"]["platform"], h["playlist"]["id"]) for h in hits})
+                st.markdown(f"### {labels[entry]} – {len(hits)} placement(s) in {playlist_count} playlist(s)")
+                for hit in hits:
+                    followers = hit["playlist"]["followers"]
+                    if isinstance(followers, int):
+                        followers = format_number(followers)
+                    st.markdown(f"- [{hit['playlist']['name']}]({hit['playlist']['url']}) ({hit['playlist']['platform'].capitalize()}, "
+                                f"Followers: {followers}) – Track #{hit['position']}: {hit['track'].get('name', '')}")
+            missing = [labels[entry] for entry, hits in report.items() if not hits]
+            if missing:
+                st.markdown(f"**Not placed:** {', '.join(missing)}")
+
 status_message = st.empty()
 progress_placeholder = st.empty()
 promo_placeholder = st.empty()
     
     
     
-spotify_playlist_ids = [
-        "6Di85VhG9vfyswWHBTEoQN", "37i9dQZF1DX4jP4eebSWR9", "37i9dQZF1DX59oR8I71XgB",
-        "37i9dQZF1DXbKGrOUA30KN", "37i9dQZF1DWUW2bvSkjcJ6", "531gtG63RwBSjuxb7XDGPL",
-        "37i9dQZF1DWSTqUqJcxFk6", "37i9dQZF1DX36edUJpD76c", "37i9dQZF1DWSFDWzEZlALC",
-        "37i9dQZF1DWTBz12MDeCuX", "37i9dQZEVXbsQiwUKyCsTG", "37i9dQZF1DXcBWIGoYBM5M",
-        "37i9dQZF1DX0XUsuxWHRQd", "37i9dQZF1DX4JAvHpjipBk", "37i9dQZF1DX7i0DhceX5x9",
-        "37i9dQZF1DX2Nc3B70tvx0", "5RyrcmTrO52jOnaBkcY9dy", "6JMZfOAvKuNGcGAl6nQ4dt",
-        "37i9dQZF1DX1zpUaiwr15A", "37i9dQZEVXbNv6cjoMVCyg", "6oiQozBfDMhbtciv64BDBA",
-        "5aZLJKzIh7iiBA64mZBhnw"
-    ]
-deezer_playlist_ids = [
-        "1111143121", "1043463931", "146820791", "1257540851",
-        "8668716682", "4524622884", "65490170", "785141981"
-    ]
-all_playlists = [(pid, "spotify") for pid in spotify_playlist_ids] + [(pid, "deezer") for pid in deezer_playlist_ids]
+all_playlists = ALL_PLAYLISTS
+# Gleichzeitig gescannte Playlists; die Requests pro Host begrenzt zusätzlich http_session
+SCAN_MAX_WORKERS = 8
 
 def update_progress_bar(current, total):
         percentage = int((current / total) * 100)
@@ -193,66 +170,49 @@ if submit and search_term:
         total_listings = 0
         unique_playlists = set()
         total_playlists = len(all_playlists)
+
         
-        # Declare global before assignment
-        global SPOTIFY_TOKEN, SPOTIFY_HEADERS
-        spotify_token = get_spotify_token()
-        SPOTIFY_TOKEN = spotify_token
-        SPOTIFY_HEADERS = {"Authorization": f"Bearer {spotify_token}"}
-        
-        for i, (pid, platform) in enumerate(all_playlists, start=1):
-            if platform == "spotify":
-                playlist = get_playlist_data(pid, spotify_token)
-                if not playlist:
-                    update_progress_bar(i, total_playlists)
-                    continue
-                playlist_name = playlist.get("name", "Unknown Playlist")
-                playlist_followers = playlist.get("followers", {}).get("total", "N/A")
-                if isinstance(playlist_followers, int):
-                    playlist_followers = format_number(playlist_followers)
-                playlist_owner = playlist.get("owner", {}).get("display_name", "N/A")
-                playlist_description = playlist.get("description", "")
-                status_message.info(f"Scanning for '{search_term}' in '{playlist_name}'")
-                tracks = find_tracks_by_artist(pid, search_term, spotify_token)
-                cover = playlist.get("images", [{}])[0].get("url")
-                playlist_url = f"https://open.spotify.com/playlist/{pid}"
-            else:
-                playlist = get_deezer_playlist_data(pid)
-                if not playlist:
-                    update_progress_bar(i, total_playlists)
-                    continue
-                playlist_name = playlist.get("title", "Unknown Playlist")
-                playlist_followers = playlist.get("fans", "N/A")
-                if isinstance(playlist_followers, int):
-                    playlist_followers = format_number(playlist_followers)
-                playlist_owner = playlist.get("user", {}).get("name", "N/A")
-                playlist_description = playlist.get("description", "")
-                status_message.info(f"Scanning for '{search_term}' in '{playlist_name}'")
-                tracks = find_tracks_by_artist_deezer(pid, search_term)
-                cover = playlist.get("picture")
-                playlist_url = f"https://www.deezer.com/playlist/{pid}"
-            
-            for match in tracks:
+        # Alle Playlists parallel scannen (begrenzt), Fortschritt nach abgeschlossenen Scans
+        scans = [None] * total_playlists
+        with ThreadPoolExecutor(max_workers=SCAN_MAX_WORKERS) as executor:
+            futures = {executor.submit(scan_playlist, pid, platform): i
+                       for i, (pid, platform) in enumerate(all_playlists)}
+            for done, future in enumerate(as_completed(futures), start=1):
+                try:
+                    scan = future.result()
+                except requests.RequestException:
+                    scan = None
+                scans[futures[future]] = scan
+                if scan:
+                    status_message.info(f"Scanning for '{search_term}' in '{scan['name']}'")
+                update_progress_bar(done, total_playlists)
+
+        # Treffer aller Playlists mit einem Lookup im invertierten Index
+        placements = search_placements(search_term, [(platform, pid) for pid, platform in all_playlists])
+        enrich_matches(placements)
+
+        # Zusammenführen in fester Playlist-Reihenfolge, unabhängig von der Fertigstellung
+        for (pid, platform), scan in zip(all_playlists, scans):
+            if not scan:
+                continue
+            for match in placements.get((platform, pid), []):
                 track = match['track']
                 position = match['position']
                 total_listings += 1
-                unique_playlists.add(playlist_name)
+                unique_playlists.add(scan["name"])
                 key = generate_track_key(track)
                 if key not in results:
                     results[key] = {"track": track, "playlists": []}
                 results[key]["playlists"].append({
-                    "name": playlist_name,
-                    "cover": cover,
-                    "url": playlist_url,
+                    "name": scan["name"],
+                    "cover": scan["cover"],
+                    "url": scan["url"],
                     "position": position,
-                    "platform": platform,
-                    "followers": playlist_followers,
-                    "owner": playlist_owner,
-                    "description": playlist_description
+                    "platform": scan["platform"],
+                    "followers": scan["followers"],
+                    "owner": scan["owner"],
+                    "description": scan["description"]
                 })
-            
-            update_progress_bar(i, total_playlists)
-            time.sleep(0.1)
         
     
 status_message.empty()
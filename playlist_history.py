@@ -0,0 +1,263 @@
+"""
+Positionsverlauf der konfigurierten Playlists.
+
+Der Recorder hält in regelmäßigen Abständen die Track-Reihenfolge jeder Playlist
+fest und speichert nur die Änderungen gegenüber dem letzten Stand: Adds, Removes
+und Moves. Ein Move wird nur für Tracks gespeichert, deren Reihenfolge relativ zu
+den anderen sich geändert hat; das bloße Nachrutschen durch Adds/Removes ergibt
+sich beim Abspielen der Deltas von selbst.
+
+Die Datei ist gzip-komprimiertes JSON in Spaltenform, Playlists und Tracks
+werden als Indizes in eigene Tabellen abgelegt:
+
+    {"playlists": ["spotify:<id>", ...],
+     "tracks": [[track_id, name, [artist_name, ...], [artist_id, ...]], ...],
+     "events": {"time": [...], "playlist": [...], "track": [...],
+                "kind": "ARM...", "position": [...], "previous": [...]},
+     "state": {"spotify:<id>": [track_index, ...]}}
+
+Positionen zählen ab 1 unter den verfügbaren Tracks einer Playlist; doppelte
+Tracks werden nur beim ersten Vorkommen gezählt.
+
+Aufruf aus dem Repo-Root:
+    python playlist_history.py record --interval 60
+    python playlist_history.py artist "Name oder Artist-ID" [--playlist spotify:<id>]
+"""
+import argparse
+import bisect
+import gzip
+import json
+import os
+import time
+
+import requests
+
+from playlists import ALL_PLAYLISTS, get_playlist
+from search_index import fold
+
+HISTORY_FILE = "playlist_history.json.gz"
+ADD, REMOVE, MOVE = "A", "R", "M"
+KIND_NAMES = {ADD: "entered", REMOVE: "left", MOVE: "moved"}
+KIND_CODES = {name: kind for kind, name in KIND_NAMES.items()}
+
+
+#############################
+# Laden & Speichern
+#############################
+def empty_history():
+    return {
+        "playlists": [],
+        "tracks": [],
+        "events": {"time": [], "playlist": [], "track": [], "kind": "", "position": [], "previous": []},
+        "state": {}
+    }
+
+
+def load_history(path=HISTORY_FILE):
+    if not os.path.exists(path):
+        return empty_history()
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_history(history, path=HISTORY_FILE):
+    # Erst in eine Temp-Datei schreiben, damit ein Abbruch die Historie nicht zerstört
+    tmp_path = f"{path}.tmp"
+    # Lookup-Indizes (_..._index) werden beim Laden neu aufgebaut
+    data = {key: value for key, value in history.items() if not key.startswith("_")}
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def _lookup(history, key, table, make_row):
+    """Index eines Eintrags in einer Lookup-Tabelle, legt ihn bei Bedarf an."""
+    cache_key = f"_{table}_index"
+    index = history.get(cache_key)
+    if index is None:
+        index = history[cache_key] = {(row[0] if isinstance(row, list) else row): i
+                                      for i, row in enumerate(history[table])}
+    if key not in index:
+        index[key] = len(history[table])
+        history[table].append(make_row())
+    return index[key]
+
+
+#############################
+# Deltas
+#############################
+def _stable_survivors(old_order, new_positions):
+    """
+    Tracks, die in beiden Ständen vorkommen und ihre relative Reihenfolge behalten
+    (längste aufsteigende Teilfolge der neuen Positionen in alter Reihenfolge).
+    """
+    survivors = [t for t in old_order if t in new_positions]
+    tails, tails_idx, parents = [], [], {}
+    for track in survivors:
+        pos = new_positions[track]
+        i = bisect.bisect_left(tails, pos)
+        parents[track] = tails_idx[i - 1] if i else None
+        if i == len(tails):
+            tails.append(pos)
+            tails_idx.append(track)
+        else:
+            tails[i] = pos
+            tails_idx[i] = track
+    stable = set()
+    track = tails_idx[-1] if tails_idx else None
+    while track is not None:
+        stable.add(track)
+        track = parents[track]
+    return stable
+
+
+def diff_orders(old_order, new_order):
+    """Liste von (kind, track, position, previous) für den Übergang old_order -> new_order."""
+    old_positions = {t: i + 1 for i, t in enumerate(old_order)}
+    new_positions = {t: i + 1 for i, t in enumerate(new_order)}
+    stable = _stable_survivors(old_order, new_positions)
+    events = [(REMOVE, t, 0, old_positions[t]) for t in old_order if t not in new_positions]
+    for t in new_order:
+        if t not in old_positions:
+            events.append((ADD, t, new_positions[t], 0))
+        elif t not in stable:
+            events.append((MOVE, t, new_positions[t], old_positions[t]))
+    return events
+
+
+def apply_events(order, events):
+    """Spielt Deltas auf eine Reihenfolge ab (Umkehrung von diff_orders)."""
+    leaving = {t for kind, t, _, _ in events if kind in (REMOVE, MOVE)}
+    result = [t for t in order if t not in leaving]
+    for kind, t, position, _ in sorted((e for e in events if e[0] in (ADD, MOVE)), key=lambda e: e[2]):
+        result.insert(position - 1, t)
+    return result
+
+
+def playlist_order(playlist):
+    """Track-IDs in Playlist-Reihenfolge, ohne leere Tracks und Duplikate."""
+    return list(dict.fromkeys(t["id"] for t in playlist["tracks"] if t and t.get("id")))
+
+
+def record_snapshot(history, playlist, now=None):
+    """Vergleicht eine Playlist mit dem letzten Stand und hängt nur die Deltas an. Liefert die Anzahl Events."""
+    now = int(now or time.time())
+    key = f"{playlist['platform']}:{playlist['id']}"
+    playlist_idx = _lookup(history, key, "playlists", lambda: key)
+    tracks_by_id = {t["id"]: t for t in playlist["tracks"] if t and t.get("id")}
+    new_order = [
+        _lookup(history, track_id, "tracks", lambda: [
+            track_id,
+            tracks_by_id[track_id].get("name", ""),
+            [a.get("name", "") for a in tracks_by_id[track_id].get("artists", [])],
+            [a.get("id", "") for a in tracks_by_id[track_id].get("artists", [])]
+        ])
+        for track_id in playlist_order(playlist)
+    ]
+    events = diff_orders(history["state"].get(key, []), new_order)
+    columns = history["events"]
+    for kind, track, position, previous in events:
+        columns["time"].append(now)
+        columns["playlist"].append(playlist_idx)
+        columns["track"].append(track)
+        columns["kind"] += kind
+        columns["position"].append(position)
+        columns["previous"].append(previous)
+    history["state"][key] = new_order
+    return len(events)
+
+
+def record_all(history, playlists=ALL_PLAYLISTS, log=print):
+    """Ein Snapshot aller Playlists; unveränderte kosten dank snapshot_id-Cache nur einen Metadaten-Request."""
+    total = 0
+    for pid, platform in playlists:
+        try:
+            playlist = get_playlist(pid, platform, ttl=0)
+        except requests.RequestException as e:
+            log(f"{platform}:{pid} konnte nicht geladen werden: {e}")
+            continue
+        if playlist:
+            total += record_snapshot(history, playlist)
+    return total
+
+
+#############################
+# Abfragen
+#############################
+def iter_events(history, playlist=None):
+    """Events als dicts, optional nur für eine Playlist ("platform:id")."""
+    columns = history["events"]
+    for i in range(len(columns["time"])):
+        key = history["playlists"][columns["playlist"][i]]
+        if playlist and key != playlist:
+            continue
+        track_id, name, artist_names, artist_ids = history["tracks"][columns["track"][i]]
+        yield {
+            "time": columns["time"][i],
+            "playlist": key,
+            "track_index": columns["track"][i],
+            "track_id": track_id,
+            "track_name": name,
+            "artists": artist_names,
+            "artist_ids": artist_ids,
+            "kind": KIND_NAMES[columns["kind"][i]],
+            "position": columns["position"][i],
+            "previous": columns["previous"][i]
+        }
+
+
+def artist_events(history, artist, playlist=None):
+    """Wann ein Artist (Name oder Artist-ID) in Playlists eingestiegen, ausgestiegen oder verschoben worden ist."""
+    folded = fold(artist)
+    return [e for e in iter_events(history, playlist)
+            if artist in e["artist_ids"] or folded in (fold(name) for name in e["artists"])]
+
+
+def position_history(history, playlist, track_id):
+    """
+    Position eines Tracks nach jedem Snapshot mit Änderungen (None = nicht in der Playlist),
+    inkl. des Nachrutschens durch andere Tracks.
+    """
+    by_time = {}
+    for e in iter_events(history, playlist):
+        by_time.setdefault(e["time"], []).append((KIND_CODES[e["kind"]], e["track_id"], e["position"], e["previous"]))
+    order = []
+    positions = []
+    for timestamp in sorted(by_time):
+        order = apply_events(order, by_time[timestamp])
+        positions.append((timestamp, order.index(track_id) + 1 if track_id in order else None))
+    return positions
+
+
+#############################
+# Kommandozeile
+#############################
+def main():
+    parser = argparse.ArgumentParser(description="Positionsverlauf der konfigurierten Playlists")
+    sub = parser.add_subparsers(dest="command", required=True)
+    record = sub.add_parser("record", help="Snapshots aufnehmen")
+    record.add_argument("--interval", type=float, default=0, help="Minuten zwischen Snapshots (0 = einmalig)")
+    query = sub.add_parser("artist", help="Verlauf eines Artists ausgeben")
+    query.add_argument("artist", help="Artist-Name oder Artist-ID")
+    query.add_argument("--playlist", help="nur diese Playlist (platform:id)")
+    parser.add_argument("--file", default=HISTORY_FILE)
+    args = parser.parse_args()
+
+    if args.command == "record":
+        while True:
+            history = load_history(args.file)
+            events = record_all(history)
+            save_history(history, args.file)
+            print(f"{time.strftime('%Y-%m-%d %H:%M:%S')}: {events} Änderungen gespeichert")
+            if not args.interval:
+                break
+            time.sleep(args.interval * 60)
+    else:
+        for e in artist_events(load_history(args.file), args.artist, args.playlist):
+            when = time.strftime("%Y-%m-%d %H:%M", time.localtime(e["time"]))
+            move = f"{e['previous']} -> {e['position']}" if e["kind"] == "moved" else (e["position"] or e["previous"])
+            print(f"{when}  {e['playlist']}  {e['kind']:<7}  #{move}  {e['track_name']} – {', '.join(e['artists'])}")
+
+
+if __name__ == "__main__":
+    main()
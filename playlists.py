@@ -0,0 +1,330 @@
+"""
+Playlists von Spotify und Deezer vollständig laden.
+
+Die erste Anfrage liefert Metadaten und die erste Track-Seite zusammen; sobald
+die Gesamtzahl bekannt ist, werden die restlichen Seiten parallel geholt. Bei
+Spotify werden per `fields=` nur die benötigten Attribute angefordert.
+Beide Plattformen werden auf dieselbe Struktur gebracht:
+
+    {"id", "platform", "name", "followers", "owner", "description", "cover",
+     "url", "snapshot", "tracks": [Track im Spotify-Format, ...]}
+
+Geladene Playlists landen in einem SQLite-Cache, gültig solange Spotifys
+`snapshot_id` bzw. Deezers `checksum` unverändert ist. Innerhalb von
+`PLAYLIST_TTL` Sekunden wird gar nicht nachgefragt, danach genügt ein
+leichter Metadaten-Request.
+
+Zu jeder gecachten Playlist führt der Cache außerdem einen invertierten Index
+(gefalteter Track-Name, Artist-Namen, Artist-IDs und deren Wörter -> Platzierung).
+Eine Suche ist damit ein Präfix-Lookup im Index, unabhängig von der Anzahl der Playlists.
+"""
+import json
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+
+import requests
+
+import http_session
+from search_index import fold
+from spotify_api import SPOTIFY_API, spotify_get
+
+DEEZER_API = "https://api.deezer.com"
+SPOTIFY_PAGE_SIZE = 100
+DEEZER_PAGE_SIZE = 100
+TRACK_FIELDS = "track(id,name,popularity,artists(id,name),album(id,release_date,images(url)))"
+META_FIELDS = "name,description,snapshot_id,followers(total),owner(display_name),images(url)"
+PLAYLIST_FIELDS = f"{META_FIELDS},tracks(total,items({TRACK_FIELDS}))"
+CACHE_FILE = "playlist_cache.sqlite"
+PLAYLIST_TTL = 300
+# Playlists, die Scanner, Verlauf und Watchlist durchsuchen
+SPOTIFY_PLAYLIST_IDS = [
+    "6Di85VhG9vfyswWHBTEoQN", "37i9dQZF1DX4jP4eebSWR9", "37i9dQZF1DX59oR8I71XgB",
+    "37i9dQZF1DXbKGrOUA30KN", "37i9dQZF1DWUW2bvSkjcJ6", "531gtG63RwBSjuxb7XDGPL",
+    "37i9dQZF1DWSTqUqJcxFk6", "37i9dQZF1DX36edUJpD76c", "37i9dQZF1DWSFDWzEZlALC",
+    "37i9dQZF1DWTBz12MDeCuX", "37i9dQZEVXbsQiwUKyCsTG", "37i9dQZF1DXcBWIGoYBM5M",
+    "37i9dQZF1DX0XUsuxWHRQd", "37i9dQZF1DX4JAvHpjipBk", "37i9dQZF1DX7i0DhceX5x9",
+    "37i9dQZF1DX2Nc3B70tvx0", "5RyrcmTrO52jOnaBkcY9dy", "6JMZfOAvKuNGcGAl6nQ4dt",
+    "37i9dQZF1DX1zpUaiwr15A", "37i9dQZEVXbNv6cjoMVCyg", "6oiQozBfDMhbtciv64BDBA",
+    "5aZLJKzIh7iiBA64mZBhnw"
+]
+DEEZER_PLAYLIST_IDS = [
+    "1111143121", "1043463931", "146820791", "1257540851",
+    "8668716682", "4524622884", "65490170", "785141981"
+]
+ALL_PLAYLISTS = [(pid, "spotify") for pid in SPOTIFY_PLAYLIST_IDS] + [(pid, "deezer") for pid in DEEZER_PLAYLIST_IDS]
+# Eigener Pool für Folgeseiten, damit parallel gescannte Playlists sich nicht gegenseitig blockieren
+_page_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="playlist-pages")
+
+
+def _get_json(url, params=None, spotify=True):
+    r = spotify_get(url, params=params) if spotify else http_session.get(url, params=params)
+    r.raise_for_status()
+    return r.json()
+
+
+#############################
+# Spotify
+#############################
+def _spotify_page(playlist_id, offset):
+    data = _get_json(f"{SPOTIFY_API}/playlists/{playlist_id}/tracks",
+                     {"offset": offset, "limit": SPOTIFY_PAGE_SIZE, "fields": f"items({TRACK_FIELDS})"})
+    return data.get("items", [])
+
+
+def fetch_spotify_playlist(playlist_id, known_snapshot=None):
+    """
+    Vollständige Playlist. Mit `known_snapshot` werden zuerst nur die Metadaten abgefragt;
+    ist die snapshot_id unverändert, kommt die Playlist mit "tracks": None zurück.
+    """
+    url = f"{SPOTIFY_API}/playlists/{playlist_id}"
+    if known_snapshot:
+        data = _get_json(url, {"fields": META_FIELDS})
+        if data.get("snapshot_id") == known_snapshot:
+            return _spotify_playlist(playlist_id, data, None)
+    data = _get_json(url, {"fields": PLAYLIST_FIELDS})
+    first = data.get("tracks", {})
+    items = first.get("items", [])
+    offsets = range(len(items), first.get("total", 0), SPOTIFY_PAGE_SIZE)
+    for page in _page_executor.map(lambda offset: _spotify_page(playlist_id, offset), offsets):
+        items.extend(page)
+    # Lokale oder entfernte Tracks liefert Spotify als null
+    return _spotify_playlist(playlist_id, data, [item.get("track") or {} for item in items])
+
+
+def _spotify_playlist(playlist_id, data, tracks):
+    images = data.get("images") or [{}]
+    return {
+        "id": playlist_id,
+        "platform": "spotify",
+        "name": data.get("name", "Unknown Playlist"),
+        "followers": data.get("followers", {}).get("total", "N/A"),
+        "owner": data.get("owner", {}).get("display_name", "N/A"),
+        "description": data.get("description", ""),
+        "cover": images[0].get("url"),
+        "url": f"https://open.spotify.com/playlist/{playlist_id}",
+        "snapshot": data.get("snapshot_id"),
+        "tracks": tracks
+    }
+
+
+#############################
+# Deezer
+#############################
+def normalize_deezer_track(track):
+    normalized = {}
+    normalized["name"] = track.get("title", "Unknown Title")
+    artist_obj = track.get("artist", {})
+    normalized["artists"] = [{
+        "name": artist_obj.get("name", "Unknown Artist"),
+        "id": str(artist_obj.get("id", ""))
+    }]
+    cover_url = track.get("album", {}).get("cover")
+    normalized["album"] = {"images": [{"url": cover_url}]} if cover_url else {"images": []}
+    normalized["streams"] = track.get("rank", 0)
+    normalized["popularity"] = 0
+    normalized["release_date"] = "N/A"
+    normalized["platform"] = "Deezer"
+    normalized["id"] = str(track.get("id"))
+    return normalized
+
+
+def _deezer_page(playlist_id, index):
+    data = _get_json(f"{DEEZER_API}/playlist/{playlist_id}/tracks",
+                     {"index": index, "limit": DEEZER_PAGE_SIZE}, spotify=False)
+    return data.get("data", [])
+
+
+def fetch_deezer_playlist(playlist_id, known_snapshot=None):
+    """Wie fetch_spotify_playlist; die erste Antwort enthält schon die checksum, Folgeseiten entfallen bei Gleichstand."""
+    # Deezer kennt kein fields=, liefert aber Metadaten und die ersten Tracks in einer Antwort
+    data = _get_json(f"{DEEZER_API}/playlist/{playlist_id}", spotify=False)
+    if "error" in data:
+        return None
+    tracks = None
+    if not known_snapshot or data.get("checksum") != known_snapshot:
+        items = data.get("tracks", {}).get("data", [])
+        indexes = range(len(items), data.get("nb_tracks", 0), DEEZER_PAGE_SIZE)
+        for page in _page_executor.map(lambda index: _deezer_page(playlist_id, index), indexes):
+            items.extend(page)
+        tracks = [normalize_deezer_track(track) if track and "artist" in track else {} for track in items]
+    return {
+        "id": playlist_id,
+        "platform": "deezer",
+        "name": data.get("title", "Unknown Playlist"),
+        "followers": data.get("fans", "N/A"),
+        "owner": data.get("creator", data.get("user", {})).get("name", "N/A"),
+        "description": data.get("description", ""),
+        "cover": data.get("picture"),
+        "url": f"https://www.deezer.com/playlist/{playlist_id}",
+        "snapshot": data.get("checksum"),
+        "tracks": tracks
+    }
+
+
+def fetch_playlist(playlist_id, platform, known_snapshot=None):
+    """Vollständige Playlist im gemeinsamen Format (None, wenn Deezer sie nicht kennt)."""
+    if platform == "spotify":
+        return fetch_spotify_playlist(playlist_id, known_snapshot)
+    return fetch_deezer_playlist(playlist_id, known_snapshot)
+
+
+#############################
+# Persistenter Cache
+#############################
+_lock = threading.Lock()
+
+
+def _connect(path):
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS playlists (platform TEXT, id TEXT, snapshot TEXT, checked_at REAL,
+                                              data TEXT, PRIMARY KEY (platform, id));
+        CREATE TABLE IF NOT EXISTS placements (platform TEXT, playlist_id TEXT, position INTEGER, track TEXT,
+                                               PRIMARY KEY (platform, playlist_id, position));
+        CREATE TABLE IF NOT EXISTS terms (term TEXT, platform TEXT, playlist_id TEXT, position INTEGER);
+        CREATE INDEX IF NOT EXISTS terms_term ON terms (term);
+        CREATE INDEX IF NOT EXISTS terms_playlist ON terms (platform, playlist_id);
+    """)
+    return conn
+
+
+def track_terms(track):
+    """Index-Begriffe eines Tracks: ganze Namen, einzelne Wörter und Artist-IDs."""
+    names = [fold(track.get("name"))] + [fold(artist.get("name")) for artist in track.get("artists", [])]
+    terms = {name for name in names if name}
+    terms.update(word for name in names for word in name.split())
+    terms.update(artist["id"] for artist in track.get("artists", []) if artist.get("id"))
+    return terms
+
+
+def _index_playlist(conn, playlist):
+    key = (playlist["platform"], playlist["id"])
+    conn.execute("DELETE FROM placements WHERE platform = ? AND playlist_id = ?", key)
+    conn.execute("DELETE FROM terms WHERE platform = ? AND playlist_id = ?", key)
+    for position, track in enumerate(playlist["tracks"], start=1):
+        if not track:
+            continue
+        conn.execute("INSERT INTO placements (platform, playlist_id, position, track) VALUES (?, ?, ?, ?)",
+                     (*key, position, json.dumps(track)))
+        conn.executemany("INSERT INTO terms (term, platform, playlist_id, position) VALUES (?, ?, ?, ?)",
+                         [(term, *key, position) for term in track_terms(track)])
+
+
+def load_cached(playlist_id, platform, path=CACHE_FILE):
+    """(Playlist, checked_at) aus dem Cache oder None."""
+    with _lock, closing(_connect(path)) as conn:
+        row = conn.execute("SELECT data, checked_at FROM playlists WHERE platform = ? AND id = ?",
+                           (platform, playlist_id)).fetchone()
+    return (json.loads(row[0]), row[1]) if row else None
+
+
+def store_cached(playlist, tracks_changed=True, path=CACHE_FILE):
+    with _lock, closing(_connect(path)) as conn, conn:
+        indexed = conn.execute("SELECT 1 FROM placements WHERE platform = ? AND playlist_id = ? LIMIT 1",
+                               (playlist["platform"], playlist["id"])).fetchone()
+        conn.execute("INSERT OR REPLACE INTO playlists (platform, id, snapshot, checked_at, data) VALUES (?, ?, ?, ?, ?)",
+                     (playlist["platform"], playlist["id"], playlist["snapshot"], time.time(), json.dumps(playlist)))
+        # Index nur neu aufbauen, wenn sich die Trackliste geändert hat (oder noch keiner existiert)
+        if tracks_changed or not indexed:
+            _index_playlist(conn, playlist)
+
+
+def get_playlist(playlist_id, platform, ttl=PLAYLIST_TTL, path=CACHE_FILE):
+    """
+    Playlist über den Cache: innerhalb von `ttl` Sekunden ohne Request, danach
+    entscheidet ein Metadaten-Request anhand von snapshot_id/checksum, ob die
+    gecachte Trackliste noch gilt. Nur geänderte Playlists werden neu geladen.
+    """
+    cached = load_cached(playlist_id, platform, path)
+    if cached and time.time() - cached[1] <= ttl:
+        return cached[0]
+    known_snapshot = cached[0]["snapshot"] if cached else None
+    playlist = fetch_playlist(playlist_id, platform, known_snapshot)
+    if playlist is None:
+        return None
+    tracks_changed = playlist["tracks"] is not None
+    if not tracks_changed:
+        # Unverändert: Metadaten (Follower etc.) auffrischen, Tracks aus dem Cache
+        playlist["tracks"] = cached[0]["tracks"]
+    store_cached(playlist, tracks_changed, path)
+    return playlist
+
+
+def search_placements(query, playlist_keys=None, path=CACHE_FILE):
+    """
+    Platzierungen, deren Track-Name, Artist-Name oder ein Wort daraus mit `query`
+    beginnt (bzw. deren Artist-ID `query` ist), per Lookup im invertierten Index.
+
+    :param playlist_keys: optional nur diese (platform, playlist_id)-Paare
+    :return: dict (platform, playlist_id) -> Liste von {"track", "position"}, nach Position sortiert
+    """
+    term = fold(query)
+    if not term:
+        return {}
+    with _lock, closing(_connect(path)) as conn:
+        rows = conn.execute(
+            "SELECT p.platform, p.playlist_id, p.position, p.track FROM placements p "
+            "JOIN (SELECT DISTINCT platform, playlist_id, position FROM terms "
+            "      WHERE (term >= ? AND term < ?) OR term = ?) t "
+            "ON p.platform = t.platform AND p.playlist_id = t.playlist_id AND p.position = t.position "
+            "ORDER BY p.platform, p.playlist_id, p.position",
+            (term, term + "\uffff", query.strip())
+        ).fetchall()
+    wanted = set(playlist_keys) if playlist_keys is not None else None
+    results = {}
+    for platform, playlist_id, position, track in rows:
+        if wanted is None or (platform, playlist_id) in wanted:
+            results.setdefault((platform, playlist_id), []).append({"track": json.loads(track), "position": position})
+    return results
+
+
+#############################
+# Watchlist
+#############################
+def watchlist_report(entries, playlists=ALL_PLAYLISTS, max_workers=8, names=None):
+    """
+    Platzierungen vieler Artists in einem Durchlauf: jede Playlist wird einmal (über den
+    Cache) geladen und jeder Track per Hash-Lookup gegen alle Einträge geprüft. Der Aufwand
+    wächst mit der Zahl der Playlists, nicht mit Playlists × Artists.
+
+    :param entries: Artist-Namen (gefaltet exakt verglichen) oder Artist-IDs
+    :param names: optional dict Eintrag -> Artist-Name; der Name trifft zusätzlich in
+        Deezer-Playlists, damit Spotify-Artist-IDs dort (mit Deezer-IDs) gefunden werden.
+        In Spotify-Playlists zählt für ID-Einträge nur die exakte Artist-ID.
+    :return: dict Eintrag -> Liste von {"playlist", "position", "track"}, in Playlist-Reihenfolge
+    """
+    lookup = {}
+    for entry in entries:
+        if entry:
+            lookup.setdefault(entry, set()).add(entry)
+            lookup.setdefault(fold(entry), set()).add(entry)
+    name_lookup = {}
+    for entry, name in (names or {}).items():
+        if entry and fold(name):
+            name_lookup.setdefault(fold(name), set()).add(entry)
+    report = {entry: [] for entry in dict.fromkeys(e for e in entries if e)}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        loaded = executor.map(lambda p: _load_for_watchlist(*p), playlists)
+        for playlist in loaded:
+            if not playlist:
+                continue
+            meta = {key: value for key, value in playlist.items() if key != "tracks"}
+            by_name = name_lookup if playlist["platform"] == "deezer" else {}
+            for position, track in enumerate(playlist["tracks"], start=1):
+                matched = set()
+                for artist in track.get("artists", []) if track else []:
+                    name = fold(artist.get("name"))
+                    matched |= lookup.get(artist.get("id"), set()) | lookup.get(name, set()) | by_name.get(name, set())
+                for entry in matched:
+                    report[entry].append({"playlist": meta, "position": position, "track": track})
+    return report
+
+
+def _load_for_watchlist(playlist_id, platform):
+    try:
+        return get_playlist(playlist_id, platform)
+    except requests.RequestException:
+        return None
@@ -2,14 +2,22 @@ import streamlit as st
 import requests
 import datetime
 import json
-import time
-import re
 import math
 import plotly.express as px
 import pandas as pd
 import os
+import threading
 from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 from utils import set_background, set_dark_mode
+from notion_store import STORE_FILE, open_store, parse_song_page, sync_songs, sync_measurements, load_metadata, load_track_assets, store_track_assets, upsert_measurement, compact_measurements, sync_rollups, rollup_properties, dirty_rollups, mark_rollup_synced, queued_archives, dequeue_archived
+from notion_api import get_client
+import http_session
+from spotify_api import chunked, fetch_tracks, get_artist_cache, get_playcount_cache, pick_country_code, primary_artist_id, track_assets
+from monthly_listeners import get_monthly_listeners, get_stats as get_listener_stats
+from search_index import SearchIndex
+from playlists import get_playlist
 
 # --- Page Configuration & Dark Mode ---
 st.set_page_config(layout="wide")
@@ -53,14 +61,12 @@ a:hover {
 songs_database_id = st.secrets["notion"]["song-database"]
 measurements_db_id = st.secrets["notion"]["measurements-database"]
 notion_secret = st.secrets["notion"]["secret"]
+# Optionale Rollup-Datenbank für verdichtete Measurements ([compaction] rollup_database)
+compaction_settings = st.secrets.get("compaction", {})
+rollup_db_id = compaction_settings.get("rollup_database")
 
-notion_query_endpoint = "https://api.notion.com/v1/databases"
-notion_page_endpoint = "https://api.notion.com/v1/pages"
-notion_headers = {
-    "Authorization": f"Bearer {notion_secret}",
-    "Content-Type": "application/json",
-    "Notion-Version": "2022-06-28"
-}
+# Prozessweiter, ratenbegrenzter Client (geteilt mit den anderen Seiten)
+notion = get_client(notion_secret)
 
 #############################
 # Logging & Fortschritt (Hauptbereich)
@@ -90,100 +96,37 @@ def show_progress(current, total, info=""):
 #############################
 # Notion-Daten: Songs-Metadaten & Measurements (inkl. Favourite)
 #############################
-@st.cache_data(show_spinner=False)
-def get_measurement_details(measurement_id):
-    url = f"{notion_page_endpoint}/{measurement_id}"
-    resp = requests.get(url, headers=notion_headers)
-    resp.raise_for_status()
-    data = resp.json()
-    props = data.get("properties", {})
-    timestamp = data.get("created_time", "")
-    return {
-        "timestamp": timestamp,
-        "song_pop": int(props.get("Song Pop", {}).get("number") or 0),
-        "artist_pop": int(props.get("Artist Pop", {}).get("number") or 0),
-        "streams": int(props.get("Streams", {}).get("number") or 0),
-        "monthly_listeners": int(props.get("Monthly Listeners", {}).get("number") or 0),
-        "artist_followers": int(props.get("Artist Followers", {}).get("number") or 0)
-    }
+NOTION_STORE_FILE = STORE_FILE
+
+def query_notion_database(database_id, filter=None):
+    return notion.run(notion.query(database_id, filter))
 
-@st.cache_data(show_spinner=False)
+@st.cache_resource
+def get_search_index():
+    return SearchIndex()
+
+# Nach Ablauf der TTL läuft der (meist inkrementelle) Sync erneut, damit auch der regelmäßige
+# vollständige Songs-Abgleich in einem lange laufenden Prozess greift
+@st.cache_data(show_spinner=False, ttl=3600)
 def get_songs_metadata():
-    url = f"{notion_query_endpoint}/{songs_database_id}/query"
-    payload = {"page_size": 100}
-    pages = []
-    has_more = True
-    start_cursor = None
-    while has_more:
-        if start_cursor:
-            payload["start_cursor"] = start_cursor
-        resp = requests.post(url, headers=notion_headers, json=payload)
-        resp.raise_for_status()
-        data = resp.json()
-        pages.extend(data.get("results", []))
-        has_more = data.get("has_more", False)
-        start_cursor = data.get("next_cursor")
-    metadata = {}
-    measurement_futures = {}
-    with ThreadPoolExecutor() as executor:
-        for page in pages:
-            props = page.get("properties", {})
-            track_name = ""
-            if "Track Name" in props and props["Track Name"].get("title"):
-                track_name = "".join([t.get("plain_text", "") for t in props["Track Name"]["title"]]).strip()
-            artist_name = ""
-            if "Artist Name" in props and props["Artist Name"].get("rich_text"):
-                artist_name = "".join([t.get("plain_text", "") for t in props["Artist Name"]["rich_text"]]).strip()
-            artist_id = ""
-            if "Artist ID" in props and props["Artist ID"].get("rich_text"):
-                artist_id = "".join([t.get("plain_text", "") for t in props["Artist ID"]["rich_text"]]).strip()
-            track_id = ""
-            if "Track ID" in props and props["Track ID"].get("rich_text"):
-                track_id = "".join([t.get("plain_text", "") for t in props["Track ID"]["rich_text"]]).strip()
-            release_date = ""
-            if "Release Date" in props and props["Release Date"].get("date"):
-                release_date = props["Release Date"]["date"].get("start", "")
-            country_code = ""
-            if "Country Code" in props and props["Country Code"].get("rich_text"):
-                country_code = "".join([t.get("plain_text", "") for t in props["Country Code"]["rich_text"]]).strip()
-            last_edited = page.get("last_edited_time", "")
-            favourite = False
-            if "Favourite" in props:
-                favourite = props["Favourite"].get("checkbox", False)
-            measurements_ids = []
-            if "Measurements" in props and props["Measurements"].get("relation"):
-                for rel in props["Measurements"]["relation"]:
-                    m_id = rel.get("id")
-                    if m_id:
-                        measurements_ids.append(m_id)
-                        measurement_futures[m_id] = executor.submit(get_measurement_details, m_id)
-            key = track_id if track_id else page.get("id")
-            metadata[key] = {
-                "page_id": page.get("id"),
-                "track_name": track_name,
-                "artist_name": artist_name,
-                "artist_id": artist_id,
-                "track_id": track_id,
-                "release_date": release_date,
-                "country_code": country_code,
-                "last_edited": last_edited,
-                "favourite": favourite,
-                "measurements_ids": measurements_ids
-            }
-        for measurement_id, future in measurement_futures.items():
-            try:
-                details = future.result()
-            except Exception as e:
-                details = {"timestamp": "", "song_pop": 0, "artist_pop": 0, "streams": 0, "monthly_listeners": 0, "artist_followers": 0}
-            for key, song_data in metadata.items():
-                if measurement_id in song_data.get("measurements_ids", []):
-                    if "measurements" not in song_data:
-                        song_data["measurements"] = []
-                    song_data["measurements"].append({"id": measurement_id, **details})
+    # Nur Änderungen seit dem letzten Sync aus Notion holen, der Rest kommt aus dem lokalen Spiegel
+    with closing(open_store(NOTION_STORE_FILE)) as conn:
+        sync_songs(conn, songs_database_id, query_notion_database, st.secrets.get("sync", {}).get("full_sync_hours", 24))
+        # Rollups zuerst, damit bereits verdichtete Roh-Measurements gar nicht erst importiert werden
+        if rollup_db_id:
+            sync_rollups(conn, rollup_db_id, query_notion_database)
+        sync_measurements(conn, measurements_db_id, query_notion_database)
+        metadata = load_metadata(conn)
+    # Suchindex nur für neue/umbenannte Songs nachziehen
+    get_search_index().sync(metadata)
     return metadata
 
 songs_metadata = get_songs_metadata()
 
+def known_track_ids():
+    """Menge aller Track IDs, die bereits in der Songs-Datenbank stehen."""
+    return {song["track_id"] for song in songs_metadata.values() if song.get("track_id")}
+
 #############################
 # Query-Parameter auslesen
 #############################
@@ -247,165 +190,129 @@ def compute_artist_hype(song):
     hype = 100 * raw / (raw + K) if raw >= 0 else 0
     return max(0, min(hype, 100))
 
-def update_hype_score_in_measurement(measurement_id, hype_score, retries=5):
-    url = f"{notion_page_endpoint}/{measurement_id}"
-    payload = {
-         "properties": {
-              "Hype Score": {"number": hype_score}
-         }
-    }
-    backoff = 1
-    for attempt in range(retries):
-        try:
-            r = requests.patch(url, headers=notion_headers, json=payload)
-            r.raise_for_status()
-            return True
-        except requests.HTTPError as e:
-            if r.status_code == 409:
-                st.warning(f"Conflict beim Update {measurement_id}, Versuch {attempt+1}/{retries}. Warte {backoff} Sekunde(n).")
-                time.sleep(backoff)
-                backoff *= 2
-                continue
-            else:
-                raise e
-    st.error(f"Update des Hype Scores für {measurement_id} nach {retries} Versuchen fehlgeschlagen.")
-    return False
-
 #############################
 # Spotify API Funktionen
 #############################
-def get_spotify_token():
-    url = "https://open.spotify.com/get_access_token?reason=transport&productType=web_player"
-    r = requests.get(url)
-    r.raise_for_status()
-    return r.json().get("accessToken")
-
-SPOTIFY_TOKEN = get_spotify_token()
-
-def get_spotify_playcount(track_id, token):
-    variables = json.dumps({"uri": f"spotify:track:{track_id}"})
-    extensions = json.dumps({
-        "persistedQuery": {
-            "version": 1,
-            "sha256Hash": "26cd58ab86ebba80196c41c3d48a4324c619e9a9d7df26ecca22417e0c50c6a4"
-        }
-    })
-    params = {"operationName": "getTrack", "variables": variables, "extensions": extensions}
-    url = "https://api-partner.spotify.com/pathfinder/v1/query"
-    headers = {"Authorization": f"Bearer {SPOTIFY_TOKEN}"}
-    try:
-        r = requests.get(url, headers=headers, params=params)
-        r.raise_for_status()
-        data = r.json()
-        return int(data["data"]["trackUnion"].get("playcount", 0))
-    except requests.HTTPError as e:
-        log(f"Error fetching playcount for track {track_id}: {e}")
+# Der Access Token kommt lazy aus dem prozessweiten Token-Manager (spotify_api.token_manager)
+# Prozessweite Caches, TTL über secrets konfigurierbar ([cache] artist_ttl_hours, playcount_ttl_minutes)
+artist_cache = get_artist_cache(st.secrets.get("cache", {}).get("artist_ttl_hours", 6) * 3600)
+# Streams teilt sich die App mit dem Playlist-Scanner
+playcount_cache = get_playcount_cache(st.secrets.get("cache", {}).get("playcount_ttl_minutes", 60) * 60)
+
+def get_spotify_playcount(track_id):
+    playcount = playcount_cache.resolve([track_id]).get(track_id)
+    if playcount is None:
+        log(f"Error fetching playcount for track {track_id}")
         return 0
-
-def get_spotify_popularity(track_id, token):
-    url = f"https://api.spotify.com/v1/tracks/{track_id}"
-    headers = {"Authorization": f"Bearer {token}"}
+    return playcount
+
+def get_monthly_listeners_from_html(artist_id, misses):
+    # Gestreamt mit Abbruch beim ersten Treffer, Ergebnis wird auf Platte gecacht.
+    # Läuft in Worker-Threads, daher wird nicht direkt geloggt, sondern in `misses` gesammelt.
+    value = get_monthly_listeners(artist_id, max_age=artist_cache.ttl)
+    if value is None:
+        misses.append(artist_id)
+    return value
+
+def save_measurement(measurement_id, song, measurement):
+    # Sofort in den Spiegel schreiben, damit is_stale() den Song beim nächsten Laden als frisch sieht
+    with closing(open_store(NOTION_STORE_FILE)) as conn, conn:
+        upsert_measurement(conn, measurement_id, song["page_id"], measurement)
+
+def save_track_assets(assets):
+    if assets:
+        with closing(open_store(NOTION_STORE_FILE)) as conn:
+            store_track_assets(conn, assets)
+
+def prefetch_track_assets(songs):
+    """
+    Ergänzt Cover-URL und Track-Link der Songs: zuerst aus dem lokalen Spiegel,
+    nur was dort fehlt, wird gebündelt bei Spotify geholt und gespeichert.
+    """
+    missing = [song for song in songs if song.get("track_id") and "cover_url" not in song]
+    if not missing:
+        return
+    with closing(open_store(NOTION_STORE_FILE)) as conn:
+        assets = load_track_assets(conn, [song["track_id"] for song in missing])
+    unknown = [song["track_id"] for song in missing if song["track_id"] not in assets]
+    if unknown:
+        try:
+            tracks = fetch_tracks(unknown)
+        except requests.HTTPError as e:
+            log(f"Fehler beim Abrufen der Cover für {len(unknown)} Tracks: {e}")
+            tracks = {}
+        # Auch nicht gefundene Tracks merken, damit sie nicht bei jedem Rerun erneut angefragt werden
+        fetched = {track_id: track_assets(tracks.get(track_id)) for track_id in unknown}
+        save_track_assets(fetched)
+        assets.update(fetched)
+    for song in missing:
+        song.update(assets.get(song["track_id"], {}))
+
+def prefetch_spotify_catalog(songs):
+    """
+    Holt Tracks aller Songs eines Refresh-Laufs in Blöcken von 50; Artists kommen
+    aus dem Artist-Cache und werden nur bei Bedarf (gebündelt) nachgeladen, Streams
+    möglichst mit einem getAlbum-Call pro Album. Fehlgeschlagene Blöcke betreffen
+    nur ihre eigenen Songs, die übrigen Ergebnisse bleiben erhalten.
+    """
+    track_ids = [song["track_id"] for song in songs if song.get("track_id")]
+    errors = []
+    tracks = fetch_tracks(track_ids, errors)
+    for chunk, e in errors:
+        log(f"Fehler beim Batch-Abruf von {len(chunk)} Tracks: {e}")
+    save_track_assets({track_id: track_assets(track) for track_id, track in tracks.items()})
+    errors = []
+    misses = []
+    artist_infos = artist_cache.resolve([primary_artist_id(t) for t in tracks.values()],
+                                        lambda artist_id: get_monthly_listeners_from_html(artist_id, misses), errors)
+    for chunk, e in errors:
+        log(f"Fehler beim Batch-Abruf von {len(chunk)} Artists: {e}")
+    for artist_id in misses:
+        log(f"Kein Wert für monatliche Hörer von Artist {artist_id} gefunden.")
     try:
-        r = requests.get(url, headers=headers)
-        r.raise_for_status()
-        data = r.json()
-        return data.get("popularity", 0)
-    except requests.HTTPError as e:
-        log(f"Error fetching popularity for track {track_id}: {e}")
-        return 0
-
-def get_monthly_listeners_from_html(artist_id):
-    url = f"https://open.spotify.com/artist/{artist_id}"
-    headers = {"User-Agent": "Mozilla/5.0", "Accept-Language": "de"}
-    r = requests.get(url, headers=headers)
-    if r.status_code == 200:
-        html = r.text
-        match = re.search(r'([\d\.,]+)\s*(?:Hörer monatlich|monatliche Hörer)', html, re.IGNORECASE)
-        if match:
-            val = match.group(1).replace('.', '').replace(',', '')
-            try:
-                return int(val)
-            except Exception as e:
-                log(f"Fehler bei der Konvertierung der monatlichen Hörer für {artist_id}: {e}")
-        else:
-            log(f"Kein passender Wert auf der Seite von Artist {artist_id} gefunden.")
-    else:
-        log(f"Fehler beim Abrufen der Artist-Seite {artist_id}: Status {r.status_code}")
-    return None
+        # Streams vorab albumweise in den Cache holen, update_song_data liest sie dann dort
+        playcount_cache.resolve(track_ids, albums={tid: t.get("album", {}).get("id") for tid, t in tracks.items()})
+    except requests.RequestException as e:
+        log(f"Fehler beim Vorabruf der Streams von {len(track_ids)} Tracks: {e}")
+    return tracks, artist_infos
 
-def update_song_data(song, token):
+def update_song_data(song, tracks=None, artist_infos=None):
     if not song.get("track_id"):
         return {}
-    url = f"https://api.spotify.com/v1/tracks/{song['track_id']}"
-    headers = {"Authorization": f"Bearer {token}"}
-    r = requests.get(url, headers=headers)
-    if r.status_code == 200:
-        data = r.json()
-        preferred_markets = {"DE", "AT", "CH"}
-        available_markets = data.get("album", {}).get("available_markets", [])
-        country_code = ""
-        for m in available_markets:
-            if m in preferred_markets:
-                country_code = m
-                break
-        if not country_code and available_markets:
-            country_code = available_markets[0]
-        song_pop = get_spotify_popularity(song["track_id"], token)
-        artists = data.get("artists", [])
-        artist_id = artists[0].get("id") if (artists and artists[0].get("id")) else ""
-        artist_pop = 0
-        artist_followers = 0
-        artist_image = ""
-        if artist_id:
-            artist_url = f"https://api.spotify.com/v1/artists/{artist_id}"
-            ar = requests.get(artist_url, headers={"Authorization": f"Bearer {token}"})
-            if ar.status_code == 200:
-                adata = ar.json()
-                artist_pop = adata.get("popularity", 0)
-                artist_followers = adata.get("followers", {}).get("total", 0)
-                if adata.get("images") and len(adata["images"]) > 0:
-                    artist_image = adata["images"][0].get("url", "")
-        streams = get_spotify_playcount(song["track_id"], token)
-        monthly_listeners = get_monthly_listeners_from_html(artist_id)
-        if monthly_listeners is None:
-            monthly_listeners = artist_followers
+    if tracks is None:
+        tracks, artist_infos = prefetch_spotify_catalog([song])
+    data = tracks.get(song["track_id"])
+    if data:
+        artist = artist_infos.get(primary_artist_id(data), {})
         return {
-            "song_pop": song_pop,
-            "artist_pop": artist_pop,
-            "country_code": country_code,
-            "artist_followers": artist_followers,
-            "streams": streams,
-            "monthly_listeners": monthly_listeners,
-            "artist_image": artist_image
+            "song_pop": data.get("popularity", 0),
+            "artist_pop": artist.get("artist_pop", 0),
+            "country_code": pick_country_code(data),
+            "artist_followers": artist.get("artist_followers", 0),
+            "streams": get_spotify_playcount(song["track_id"]),
+            "monthly_listeners": artist.get("monthly_listeners", 0),
+            "artist_image": artist.get("artist_image", "")
         }
     else:
-        st.error(f"Error fetching data for track {song['track_name']}: {r.text}")
+        st.error(f"Error fetching data for track {song['track_name']}: nicht im Spotify-Katalog gefunden")
         return {}
 
 #############################
 # Favourites-Funktionalität
 #############################
 def update_favourite_property(page_id, new_state):
-    url = f"{notion_page_endpoint}/{page_id}"
-    payload = {
-        "properties": {
-            "Favourite": {"checkbox": new_state}
-        }
-    }
-    st.write(f"Updating page {page_id} with payload: {payload}")  # Debug-Ausgabe
-    r = requests.patch(url, headers=notion_headers, json=payload)
+    properties = {"Favourite": {"checkbox": new_state}}
+    st.write(f"Updating page {page_id} with properties: {properties}")  # Debug-Ausgabe
     try:
-        r.raise_for_status()
-        st.write(f"Update successful for page {page_id}: {r.json()}")
-    except Exception as e:
-        st.error(f"Update failed for page {page_id}: {r.text}")
+        data = notion.run(notion.update_page(page_id, properties))
+        st.write(f"Update successful for page {page_id}: {data}")
+    except requests.HTTPError as e:
+        st.error(f"Update failed for page {page_id}: {e.response.text}")
         raise e
 
 def is_song_favourite(page_id):
-    url = f"{notion_page_endpoint}/{page_id}"
-    r = requests.get(url, headers=notion_headers)
-    r.raise_for_status()
-    return r.json().get("properties", {}).get("Favourite", {}).get("checkbox", False)
+    page = notion.run(notion.get_page(page_id))
+    return page.get("properties", {}).get("Favourite", {}).get("checkbox", False)
 
 def is_artist_favourite(artist_id):
     for song in songs_metadata.values():
@@ -413,60 +320,191 @@ def is_artist_favourite(artist_id):
             return True
     return False
 
+def get_artist_info(song):
+    """Artist-Daten eines Songs: gecachte Artist-Werte, überschrieben vom letzten Measurement."""
+    return {**(artist_cache.get(song.get("artist_id")) or {}), **song.get("latest_measurement", {})}
+
 def toggle_favourite_for_artist(artist_id, new_state=True):
     for song in songs_metadata.values():
         if song.get("artist_id") == artist_id:
             update_favourite_property(song["page_id"], new_state)
 
+#############################
+# Neue Songs anlegen
+#############################
+def normalize_release_date(release_date):
+    # Spotify liefert je nach release_date_precision "2024", "2024-05" oder "2024-05-17"
+    parts = (release_date or "").split("-")
+    if not parts[0]:
+        return ""
+    parts += ["01"] * (3 - len(parts))
+    return "-".join(parts[:3])
+
+def song_properties(track):
+    """Notion-Properties eines neuen Songs, passend zu dem, was get_songs_metadata() liest."""
+    artists = track.get("artists", [])
+    properties = {
+        "Track Name": {"title": [{"text": {"content": track.get("name", "")}}]},
+        "Artist Name": {"rich_text": [{"text": {"content": artists[0].get("name", "") if artists else ""}}]},
+        "Artist ID": {"rich_text": [{"text": {"content": primary_artist_id(track)}}]},
+        "Track ID": {"rich_text": [{"text": {"content": track["id"]}}]},
+        "Country Code": {"rich_text": [{"text": {"content": pick_country_code(track)}}]}
+    }
+    release_date = normalize_release_date(track.get("album", {}).get("release_date"))
+    if release_date:
+        properties["Release Date"] = {"date": {"start": release_date}}
+    return properties
+
+# Notion erlaubt höchstens 100 Bedingungen pro "or"-Filter
+TRACK_ID_CHECK_SIZE = 100
+
+def existing_track_ids(track_ids):
+    """
+    Track IDs, die laut Notion schon in der Songs-Datenbank stehen – direkt vor dem Anlegen
+    abgefragt (eine "or"-Query pro Block), da der gecachte Spiegel veraltet sein kann.
+    """
+    queries = [
+        notion.query(songs_database_id, {"or": [{"property": "Track ID", "rich_text": {"equals": track_id}} for track_id in chunk]})
+        for chunk in chunked(list(track_ids), TRACK_ID_CHECK_SIZE)
+    ]
+    return {parse_song_page(page)["track_id"] for pages in notion.run_all(queries) for page in pages}
+
+def create_songs(tracks):
+    """
+    Legt die Songs gleichzeitig an; der Notion-Client begrenzt Rate und Parallelität.
+    Liefert (Anzahl angelegt, Liste der Fehlschläge als (Track, Exception)).
+    """
+    results = notion.run_all([notion.create_page(songs_database_id, song_properties(t)) for t in tracks],
+                             return_exceptions=True)
+    failed = [(t, r) for t, r in zip(tracks, results) if isinstance(r, Exception)]
+    return len(tracks) - len(failed), failed
+
 #############################
 # Measurement-Einträge & Hype Score Update
 #############################
-def create_measurement_entry(song, details):
+def create_measurement_entry(song, details, hype_score):
+    """
+    Legt das Measurement mit einem einzigen Create an, inkl. Hype Score. Die
+    Song-Relation ist zweiseitig, Notion trägt das Measurement also selbst beim Song ein.
+    """
     now = datetime.datetime.now().isoformat()
-    payload = {
-        "parent": {"database_id": measurements_db_id},
-        "properties": {
-            "Name": {"title": [{"text": {"content": f"Measurement {now}"}}]},
-            "Song": {"relation": [{"id": song["page_id"]}]},
-            "Song Pop": {"number": details.get("song_pop", 0)},
-            "Artist Pop": {"number": details.get("artist_pop", 0)},
-            "Streams": {"number": details.get("streams", 0)},
-            "Monthly Listeners": {"number": details.get("monthly_listeners", 0)},
-            "Artist Followers": {"number": details.get("artist_followers", 0)},
-            "Artist Hype Score": {"number": float(compute_artist_hype(song))}
-        }
+    properties = {
+        "Name": {"title": [{"text": {"content": f"Measurement {now}"}}]},
+        "Song": {"relation": [{"id": song["page_id"]}]},
+        "Song Pop": {"number": details.get("song_pop", 0)},
+        "Artist Pop": {"number": details.get("artist_pop", 0)},
+        "Streams": {"number": details.get("streams", 0)},
+        "Monthly Listeners": {"number": details.get("monthly_listeners", 0)},
+        "Artist Followers": {"number": details.get("artist_followers", 0)},
+        "Artist Hype Score": {"number": float(compute_artist_hype(song))},
+        "Hype Score": {"number": hype_score}
     }
-    r = requests.post(notion_page_endpoint, headers=notion_headers, json=payload)
-    r.raise_for_status()
-    return r.json().get("id")
-
-def update_song_measurements_relation(page_id, new_measurement_id, retries=3):
-    for attempt in range(retries):
-        url = f"{notion_page_endpoint}/{page_id}"
-        r = requests.get(url, headers=notion_headers)
-        r.raise_for_status()
-        page_data = r.json()
-        props = page_data.get("properties", {})
-        current_rels = []
-        if "Measurements" in props and props["Measurements"].get("relation"):
-            current_rels = props["Measurements"]["relation"]
-        if not any(rel.get("id") == new_measurement_id for rel in current_rels):
-            current_rels.append({"id": new_measurement_id})
-        payload = {
-            "properties": {
-                "Measurements": {"relation": current_rels}
-            }
-        }
-        patch_resp = requests.patch(url, headers=notion_headers, json=payload)
-        if patch_resp.status_code == 200:
-            return
-        elif patch_resp.status_code == 409:
-            st.warning(f"Conflict beim Update von Seite {page_id}, Versuch {attempt+1}/3. Warte 1 Sekunde.")
-            time.sleep(1)
-            continue
-        else:
-            patch_resp.raise_for_status()
-    st.warning(f"Konnte Measurements für Seite {page_id} nach {retries} Versuchen nicht aktualisieren.")
+    page = notion.run(notion.create_page(measurements_db_id, properties))
+    return page.get("id")
+
+def compute_refresh_hype(song, details):
+    """Hype Score eines neuen Measurements relativ zum vorletzten gespeicherten Measurement."""
+    measurements = song.get("measurements", [])
+    EPSILON = 5
+    if len(measurements) >= 2:
+        sorted_ms = sorted(measurements, key=lambda m: safe_timestamp(m))
+        previous = sorted_ms[-2]
+        prev_streams = previous.get("streams", 0)
+        prev_pop = previous.get("song_pop", 0)
+        prev_base = (prev_streams * 14.8) + (prev_pop * 8.75)
+        current_streams = details.get("streams", 0)
+        current_pop = details.get("song_pop", 0)
+        current_base = (current_streams * 14.8) + (current_pop * 8.75)
+        growth = current_base - prev_base
+        raw = 0 if abs(growth) < EPSILON else current_base + growth
+        K = 100
+    else:
+        raw = 0
+        K = 1000
+    return 100 * raw / (raw + K) if raw >= 0 else 0
+
+def refresh_song(song, tracks=None, artist_infos=None):
+    """Holt aktuelle Spotify-Werte, legt ein Measurement an und liefert den Hype Score (None bei Fehler)."""
+    details = update_song_data(song, tracks, artist_infos)
+    if not details:
+        # Ohne Spotify-Werte kein Measurement, sonst landen Nullen in der Historie
+        return None
+    hype = compute_refresh_hype(song, details)
+    try:
+        measurement_id = create_measurement_entry(song, details, hype)
+    except requests.HTTPError as e:
+        st.error(f"Measurement für {song.get('track_name')} konnte nicht angelegt werden: {e}")
+        return None
+    song["latest_measurement"] = {**details, "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat()}
+    if measurement_id:
+        save_measurement(measurement_id, song, song["latest_measurement"])
+    return hype
+
+#############################
+# Hintergrund-Aktualisierung von Suchtreffern
+#############################
+refresh_settings = st.secrets.get("refresh", {})
+# Obergrenze der Songs in Arbeit; wie viele Requests pro Host tatsächlich parallel laufen,
+# regelt der adaptive Limiter in http_session
+REFRESH_MAX_WORKERS = refresh_settings.get("max_workers", 16)
+REFRESH_MAX_AGE_HOURS = refresh_settings.get("max_age_hours", 2)
+
+def is_stale(song, max_age_hours=REFRESH_MAX_AGE_HOURS):
+    """True, wenn das letzte Measurement des Songs älter als `max_age_hours` ist (oder fehlt)."""
+    timestamp = song.get("latest_measurement", {}).get("timestamp")
+    if not timestamp:
+        return True
+    try:
+        measured = datetime.datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    except ValueError:
+        return True
+    if measured.tzinfo is None:
+        measured = measured.replace(tzinfo=datetime.timezone.utc)
+    age = datetime.datetime.now(datetime.timezone.utc) - measured
+    return age.total_seconds() > max_age_hours * 3600
+
+def start_background_refresh(songs):
+    """
+    Aktualisiert die veralteten Songs in einem Hintergrund-Thread mit höchstens
+    REFRESH_MAX_WORKERS parallelen Songs. Der Fortschritt steht in st.session_state.refresh_job.
+    Läuft bereits ein Job, wird kein zweiter gestartet (Rückgabe None).
+    """
+    running = st.session_state.get("refresh_job")
+    if running and not running["finished"]:
+        return None
+    stale = [song for song in songs if song.get("track_id") and is_stale(song)]
+    job = {"total": len(stale), "done": 0, "failed": 0, "finished": False}
+    job_lock = threading.Lock()
+    ctx = get_script_run_ctx()
+
+    def refresh_one(song, tracks, artist_infos):
+        try:
+            hype = refresh_song(song, tracks, artist_infos)
+        except Exception as e:
+            log(f"Aktualisierung von '{song.get('track_name')}' fehlgeschlagen: {e}")
+            hype = None
+        with job_lock:
+            job["done"] += 1
+            if hype is None:
+                job["failed"] += 1
+
+    def run():
+        try:
+            tracks, artist_infos = prefetch_spotify_catalog(stale)
+            with ThreadPoolExecutor(max_workers=REFRESH_MAX_WORKERS,
+                                    initializer=lambda: add_script_run_ctx(threading.current_thread(), ctx)) as executor:
+                for song in stale:
+                    executor.submit(refresh_one, song, tracks, artist_infos)
+        finally:
+            # Die neuen Measurements stehen im Spiegel; beim nächsten Rerun die Metadaten neu laden
+            get_songs_metadata.clear()
+            job["finished"] = True
+
+    thread = threading.Thread(target=run, daemon=True, name="refresh-matches")
+    add_script_run_ctx(thread, ctx)
+    thread.start()
+    st.session_state.refresh_job = job
+    return job
 
 #############################
 # Graph-Funktionen
@@ -536,6 +574,8 @@ def group_results_by_artist(results):
 #############################
 def display_search_results(results):
     st.title("Search Results")
+    # Cover & Links kommen aus dem lokalen Cache, fehlende werden vorab gebündelt geholt
+    prefetch_track_assets(results.values())
     grouped = group_results_by_artist(results)
     for group_key, songs in grouped.items():
         rep = songs[0]
@@ -543,10 +583,11 @@ def display_search_results(results):
         artist_id = rep.get("artist_id", "")
         artist_link = f"https://open.spotify.com/artist/{artist_id}" if artist_id else ""
         hype_artist = compute_artist_hype(rep)
-        artist_pop = rep.get("latest_measurement", {}).get("artist_pop", 0)
-        monthly_listeners = rep.get("latest_measurement", {}).get("monthly_listeners", 0)
-        artist_followers = rep.get("latest_measurement", {}).get("artist_followers", 0)
-        artist_img = rep.get("latest_measurement", {}).get("artist_image", "")
+        artist_info = get_artist_info(rep)
+        artist_pop = artist_info.get("artist_pop", 0)
+        monthly_listeners = artist_info.get("monthly_listeners", 0)
+        artist_followers = artist_info.get("artist_followers", 0)
+        artist_img = artist_info.get("artist_image", "")
         fav_state = rep.get("favourite", False)
         star_icon = "★" if fav_state else "☆"
         
@@ -580,19 +621,8 @@ def display_search_results(results):
             with st.container():
                 cols_song = st.columns([1, 2])
                 with cols_song[0]:
-                    try:
-                        track_url = f"https://api.spotify.com/v1/tracks/{song['track_id']}"
-                        r = requests.get(track_url, headers={"Authorization": f"Bearer {SPOTIFY_TOKEN}"})
-                        r.raise_for_status()
-                        data = r.json()
-                        cover_url = ""
-                        if data.get("album") and data["album"].get("images"):
-                            cover_url = data["album"]["images"][0].get("url", "")
-                        song_link = data.get("external_urls", {}).get("spotify", "")
-                    except Exception as e:
-                        log(f"Fehler beim Abrufen des Covers für {song.get('track_name')}: {e}")
-                        cover_url = ""
-                        song_link = ""
+                    cover_url = song.get("cover_url", "")
+                    song_link = song.get("track_url", "")
                     st.markdown(f'<a href="{song_link}" target="_blank"><img src="{cover_url}" alt="Cover" style="width:100%; border-radius:8px; object-fit:cover;"></a>', unsafe_allow_html=True)
                     song_title = song.get("track_name", "Unknown Song")
                     st.markdown(f"<h2 style='margin: 10px 0 5px 0; color:#ffffff;'><a href='{song_link}' target='_blank' style='color:#ffffff;'>{song_title}</a></h2>", unsafe_allow_html=True)
@@ -620,6 +650,9 @@ def display_search_results(results):
 st.sidebar.title("Search")
 search_query = st.sidebar.text_input("Search by artist or song:", "")
 start_search = st.sidebar.button("Start Search", key="start_search_button")
+refresh_matches = st.sidebar.button("Treffer aktualisieren", key="refresh_matches_button",
+                                    help=f"Aktualisiert Treffer, deren letzte Messung älter als {REFRESH_MAX_AGE_HOURS}h ist, im Hintergrund.")
+refresh_status = st.sidebar.empty()
 
 st.sidebar.markdown("## Filters")
 pop_range = st.sidebar.slider("Popularity Range", 0, 100, (0, 100))
@@ -631,38 +664,68 @@ confirm_filters = st.sidebar.button("Confirm Filters", key="confirm_filters_butt
 st.sidebar.title("Actions")
 if st.sidebar.button("Get New Music", key="get_new_music_button"):
     def run_get_new_music():
-        token = get_spotify_token()
-        log(f"Spotify Access Token: {token}")
         all_songs = []
         for pid in st.secrets["spotify"]["playlist_ids"]:
-            r = requests.get(f"https://api.spotify.com/v1/playlists/{pid}", headers={"Authorization": f"Bearer {token}"})
-            data = r.json()
-            items = data.get("tracks", {}).get("items", [])
-            for item in items:
-                track = item.get("track")
-                if track:
-                    all_songs.append(track)
+            # Alle Seiten der Playlist, nicht nur die ersten 100 Tracks
+            try:
+                playlist = get_playlist(pid, "spotify")
+            except requests.RequestException as e:
+                log(f"Playlist {pid} konnte nicht geladen werden: {e}")
+                continue
+            all_songs.extend(track for track in playlist["tracks"] if track)
         log(f"Gesammelte Songs: {len(all_songs)}")
+        # Bekannte Track IDs einmal aus den gecachten Metadaten statt einer Notion-Query pro Track
+        known_ids = known_track_ids()
+        new_tracks = []
         for s in all_songs:
             if s.get("id"):
-                if song_exists_in_notion(s["id"]):
+                if s["id"] in known_ids:
                     log(f"{s.get('name')} existiert bereits.")
                 else:
-                    log(f"{s.get('name')} wird erstellt.")
-                    # Hier Funktion zum Erstellen in Notion aufrufen
+                    # Auch Duplikate über mehrere Playlists hinweg nur einmal anlegen
+                    known_ids.add(s["id"])
+                    new_tracks.append(s)
             else:
                 log(f"{s.get('name')} hat keine Track ID und wird übersprungen.")
+        if not new_tracks:
+            return
+        # Der Spiegel kann veraltet sein (z.B. durch eine andere Session): unmittelbar vorher in Notion nachsehen
+        try:
+            existing = existing_track_ids(t["id"] for t in new_tracks)
+        except requests.HTTPError as e:
+            log(f"Abgleich mit der Songs-Datenbank fehlgeschlagen, es werden keine Songs angelegt: {e}")
+            return
+        for t in new_tracks:
+            log(f"{t.get('name')} existiert bereits." if t["id"] in existing else f"{t.get('name')} wird erstellt.")
+        new_tracks = [t for t in new_tracks if t["id"] not in existing]
+        if existing:
+            get_songs_metadata.clear()
+        if not new_tracks:
+            return
+        # Playlist-Tracks kommen ohne Märkte zurück; für den Country Code die vollen Track-Objekte gebündelt holen
+        errors = []
+        full_tracks = fetch_tracks([t["id"] for t in new_tracks], errors)
+        for chunk, e in errors:
+            log(f"Fehler beim Abruf von {len(chunk)} Tracks, Country Code fehlt: {e}")
+        new_tracks = [full_tracks.get(t["id"], t) for t in new_tracks]
+        created, failed = create_songs(new_tracks)
+        for track, error in failed:
+            log(f"Anlegen fehlgeschlagen für {track.get('name')}: {error}")
+        log(f"{created} neue Songs angelegt.")
+        if created:
+            # Beim nächsten Laden holt der Sync die neuen Seiten in den lokalen Spiegel
+            get_songs_metadata.clear()
     run_get_new_music()
     log("Get New Music abgeschlossen. Bitte Seite neu laden.")
     
 if st.sidebar.button("Get Data", key="get_data_button"):
     def fill_song_measurements():
-        token = get_spotify_token()
         messages = []
         total = len(songs_metadata)
         progress_container.empty()
         i = 0
         now = datetime.datetime.now(datetime.timezone.utc)
+        to_update = set()
         for key, song in songs_metadata.items():
             update_needed = True
             if song.get("last_edited"):
@@ -674,32 +737,16 @@ if st.sidebar.button("Get Data", key="get_data_button"):
                 except Exception as e:
                     log(f"Zeitkonvertierungsfehler bei '{song.get('track_name')}': {e}")
             if update_needed and song.get("track_id"):
-                details = update_song_data(song, token)
-                new_meas_id = create_measurement_entry(song, details)
-                update_song_measurements_relation(song["page_id"], new_meas_id)
-                measurements = song.get("measurements", [])
-                EPSILON = 5
-                if len(measurements) >= 2:
-                    sorted_ms = sorted(measurements, key=lambda m: safe_timestamp(m))
-                    previous = sorted_ms[-2]
-                    prev_streams = previous.get("streams", 0)
-                    prev_pop = previous.get("song_pop", 0)
-                    prev_base = (prev_streams * 14.8) + (prev_pop * 8.75)
-                    current_streams = details.get("streams", 0)
-                    current_pop = details.get("song_pop", 0)
-                    current_base = (current_streams * 14.8) + (current_pop * 8.75)
-                    growth = current_base - prev_base
-                    raw = 0 if abs(growth) < EPSILON else current_base + growth
-                    K = 100
-                else:
-                    raw = 0
-                    K = 1000
-                hype = 100 * raw / (raw + K) if raw >= 0 else 0
-                if not update_hype_score_in_measurement(new_meas_id, hype):
+                to_update.add(key)
+        # Tracks & Artists für den ganzen Lauf gebündelt holen statt drei GETs pro Song
+        tracks, artists = prefetch_spotify_catalog([songs_metadata[key] for key in to_update])
+        for key, song in songs_metadata.items():
+            if key in to_update:
+                hype = refresh_song(song, tracks, artists)
+                if hype is None:
                     log(f"Hype Score Update fehlgeschlagen für {song.get('track_name')}.")
                     i += 1
                     continue
-                song["latest_measurement"] = details
                 msg = f"'{song.get('track_name')}' aktualisiert. Hype Score: {hype:.1f}"
                 messages.append(msg)
                 log(msg)
@@ -711,33 +758,98 @@ if st.sidebar.button("Get Data", key="get_data_button"):
     for msg in msgs:
         log(msg)
 
-def song_exists_in_notion(track_id):
-    payload = {
-        "filter": {
-            "property": "Track ID",
-            "rich_text": {"equals": track_id}
-        }
-    }
-    r = requests.post(f"{notion_query_endpoint}/{songs_database_id}/query", headers=notion_headers, json=payload)
-    if r.status_code == 200:
-        return len(r.json().get("results", [])) > 0
-    else:
-        st.error("Notion-Query Fehler: " + r.text)
-        return False
+# Rohseiten nur archivieren, wenn die Rollups dauerhaft in Notion liegen; sonst bleibt Notion die vollständige Quelle
+ARCHIVE_RAW = bool(rollup_db_id) and compaction_settings.get("archive", False)
+# Notion-Requests pro Block; nach jedem Block wird der Fortschritt im Spiegel festgehalten
+COMPACTION_CHUNK_SIZE = compaction_settings.get("chunk_size", 50)
+
+def push_rollups(job):
+    """Legt geänderte Rollups in der Rollup-Datenbank an bzw. aktualisiert sie, blockweise."""
+    with closing(open_store(NOTION_STORE_FILE)) as conn:
+        rows = dirty_rollups(conn)
+    job["rollups_total"] = len(rows)
+    for chunk in chunked(rows, COMPACTION_CHUNK_SIZE):
+        results = notion.run_all([
+            notion.update_page(row["page_id"], rollup_properties(row)) if row["page_id"]
+            else notion.create_page(rollup_db_id, rollup_properties(row))
+            for row in chunk
+        ], return_exceptions=True)
+        with closing(open_store(NOTION_STORE_FILE)) as conn, conn:
+            for row, result in zip(chunk, results):
+                if isinstance(result, Exception):
+                    job["failed"] += 1
+                else:
+                    mark_rollup_synced(conn, row, result.get("id"))
+        job["rollups_done"] += len(chunk)
+
+def archive_pages(job, kinds):
+    """Archiviert die vorgemerkten Notion-Seiten blockweise; erfolgreiche verlassen die Warteschlange."""
+    with closing(open_store(NOTION_STORE_FILE)) as conn:
+        ids = queued_archives(conn, kinds)
+    job["archive_total"] += len(ids)
+    for chunk in chunked(ids, COMPACTION_CHUNK_SIZE):
+        results = notion.run_all([notion.update_page(page_id, archived=True) for page_id in chunk], return_exceptions=True)
+        done = [page_id for page_id, result in zip(chunk, results) if not isinstance(result, Exception)]
+        with closing(open_store(NOTION_STORE_FILE)) as conn:
+            dequeue_archived(conn, done)
+        job["archived"] += len(done)
+        job["failed"] += len(chunk) - len(done)
+
+def start_compaction():
+    """
+    Verdichtet lokal, lädt die Rollups in die Rollup-Datenbank und archiviert danach die
+    ersetzten Seiten – alles in einem Hintergrund-Thread. Rohseiten werden nur archiviert,
+    wenn alle Rollups in Notion stehen. Fortschritt in st.session_state.compaction_job.
+    """
+    running = st.session_state.get("compaction_job")
+    if running and not running["finished"]:
+        return None
+    job = {"compacted": 0, "rollups_total": 0, "rollups_done": 0, "archive_total": 0, "archived": 0,
+           "failed": 0, "finished": False}
+    ctx = get_script_run_ctx()
+
+    def run():
+        try:
+            with closing(open_store(NOTION_STORE_FILE)) as conn:
+                job["compacted"] = len(compact_measurements(conn, compaction_settings.get("raw_days", 7),
+                                                            compaction_settings.get("daily_days", 90), archive_raw=ARCHIVE_RAW))
+            if rollup_db_id:
+                push_rollups(job)
+                with closing(open_store(NOTION_STORE_FILE)) as conn:
+                    pending = len(dirty_rollups(conn))
+                archive_pages(job, ["rollup", "raw"] if ARCHIVE_RAW and not pending else ["rollup"])
+        finally:
+            get_songs_metadata.clear()
+            job["finished"] = True
+
+    thread = threading.Thread(target=run, daemon=True, name="compact-measurements")
+    add_script_run_ctx(thread, ctx)
+    thread.start()
+    st.session_state.compaction_job = job
+    return job
+
+compaction_status = st.sidebar.empty()
+if st.sidebar.button("Measurements verdichten", key="compact_button",
+                     help="Fasst alte Measurements zu Tages- bzw. Wochenwerten zusammen (im Hintergrund). Mit Rollup-Datenbank "
+                          "werden die Rollups in Notion gesichert und, falls aktiviert, die Rohseiten archiviert."):
+    if start_compaction() is None:
+        compaction_status.warning("Es läuft bereits eine Verdichtung.")
+    elif not rollup_db_id:
+        log("Keine Rollup-Datenbank konfiguriert: Rollups bleiben lokal, Rohseiten in Notion werden nicht archiviert.")
+if "compaction_job" in st.session_state:
+    job = st.session_state.compaction_job
+    state = "abgeschlossen" if job["finished"] else "läuft"
+    compaction_status.caption(f"Verdichtung {state}: {job['compacted']} Measurements verdichtet, "
+                              f"{job['rollups_done']}/{job['rollups_total']} Rollups gesichert, "
+                              f"{job['archived']}/{job['archive_total']} Seiten archiviert, {job['failed']} Fehler.")
+
+# Höchstens so viele Treffer pro Suche; mit Limit bricht der Index nach ausreichend guten Treffern ab
+SEARCH_LIMIT = st.secrets.get("search", {}).get("limit", 200)
 
 def search_songs(query):
-    query_lower = query.lower()
-    results = {}
-    for key, song in songs_metadata.items():
-        if query_lower in song.get("track_name", "").lower() or query_lower in song.get("artist_name", "").lower():
-            details = update_song_data(song, SPOTIFY_TOKEN)
-            new_meas_id = create_measurement_entry(song, details)
-            update_song_measurements_relation(song["page_id"], new_meas_id)
-            hype = compute_song_hype({**song, "measurements": song.get("measurements", []) + [details]})
-            update_hype_score_in_measurement(new_meas_id, hype)
-            song["latest_measurement"] = details
-            results[key] = song
-    return results
+    # Reine Lesesuche über den Index – Aktualisieren ist eine eigene Aktion.
+    # Treffer kommen nach Relevanz sortiert (exakt, Präfix, Teilstring, unscharf).
+    return {key: songs_metadata[key] for key in get_search_index().search(query, limit=SEARCH_LIMIT) if key in songs_metadata}
 
 def apply_filters_and_sort(results):
     filtered = {}
@@ -776,6 +888,22 @@ else:
     st.title("Search Results")
     st.write("Bitte einen Suchbegriff eingeben oder Filter bestätigen.")
 
+if refresh_matches:
+    if search_query:
+        job = start_background_refresh(search_songs(search_query).values())
+        if job is None:
+            refresh_status.warning("Es läuft bereits eine Aktualisierung.")
+        else:
+            log(f"Aktualisiere {job['total']} veraltete Treffer für '{search_query}' im Hintergrund.")
+    else:
+        refresh_status.warning("Bitte zuerst einen Suchbegriff eingeben.")
+if "refresh_job" in st.session_state:
+    job = st.session_state.refresh_job
+    if job["finished"]:
+        refresh_status.caption(f"Aktualisierung abgeschlossen: {job['done'] - job['failed']}/{job['total']} Songs.")
+    else:
+        refresh_status.caption(f"Aktualisierung läuft: {job['done']}/{job['total']} Songs …")
+
 #############################
 # Persistente Speicherung für "Zuletzt angesehen"
 #############################
@@ -800,7 +928,7 @@ if st.session_state.recent_searches:
     for tile in st.session_state.recent_searches:
         for song in songs_metadata.values():
             if song.get("artist_name") == tile["artist_name"]:
-                new_meas = song.get("latest_measurement", {})
+                new_meas = get_artist_info(song)
                 tile["artist_img"] = new_meas.get("artist_image", tile.get("artist_img"))
                 tile["artist_pop"] = new_meas.get("artist_pop", tile.get("artist_pop"))
                 tile["monthly_listeners"] = new_meas.get("monthly_listeners", tile.get("monthly_listeners"))
@@ -814,11 +942,12 @@ if start_search or confirm_filters:
         recent_tiles = []
         for group_key, songs in grouped.items():
             rep = songs[0]
+            artist_info = get_artist_info(rep)
             tile = {
-                "artist_img": rep.get("latest_measurement", {}).get("artist_image", ""),
+                "artist_img": artist_info.get("artist_image", ""),
                 "artist_name": rep.get("artist_name", "Unbekannt"),
-                "artist_pop": rep.get("latest_measurement", {}).get("artist_pop", 0),
-                "monthly_listeners": rep.get("latest_measurement", {}).get("monthly_listeners", 0)
+                "artist_pop": artist_info.get("artist_pop", 0),
+                "monthly_listeners": artist_info.get("monthly_listeners", 0)
             }
             recent_tiles.append(tile)
         for tile in recent_tiles:
@@ -845,6 +974,16 @@ if st.session_state.recent_searches:
             </a>
             """, unsafe_allow_html=True)
 
+# HTTP- und Scraper-Statistik
+with st.sidebar.expander("Statistik", expanded=False):
+    stats = http_session.host_stats()
+    if stats:
+        st.dataframe(pd.DataFrame.from_dict(stats, orient="index"))
+    listener_stats = get_listener_stats()
+    st.write(f"Monatliche Hörer – Cache-Treffer: {listener_stats['hits']}, Cache-Fehlzugriffe: {listener_stats['misses']}, "
+             f"Parse-Fehler: {listener_stats['parse_failures']}, HTTP-Fehler: {listener_stats['http_errors']}, "
+             f"gelesen: {listener_stats['bytes_read'] // 1024} KB")
+
 # Log- und Fortschrittscontainer ausblenden, falls keine Logmeldungen mehr vorhanden
 if not st.session_state.get("log_messages"):
     log_container.empty()
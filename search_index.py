@@ -0,0 +1,248 @@
+"""
+Suchindex über Track- und Artist-Namen.
+
+Texte werden gefaltet (Groß-/Kleinschreibung, Akzente). Feld- und Wortanfänge
+liegen in sortierten Listen und werden per Bisect gefunden, Teilstring-Treffer
+entstehen aus der Schnittmenge der Trigramm-Listen, unscharfe Treffer aus dem
+Trigramm-Überlapp. Anfragen unter drei Zeichen haben keine eigenen Trigramme;
+ihre Teilstring-Treffer (z.B. "l" in "Hallo") kommen aus den Listen aller
+Trigramme, die die Anfrage enthalten.
+
+Mit `limit` wird stufenweise gesucht (exakt/Feldanfang, Wortanfang, Teilstring,
+unscharf): reichen die Treffer einer Stufe, entfallen die übrigen, und pro Stufe
+werden höchstens `CANDIDATE_CAP` Kandidaten bewertet. Innerhalb einer gekappten
+Stufe ist die Reihenfolge (kürzere Felder zuerst) daher nur näherungsweise;
+unscharfe Kandidaten kommen bevorzugt über die seltensten Trigramme der Anfrage.
+
+Der Index wird prozessweit geteilt; Pflege und Suche laufen unter einem Lock.
+"""
+import bisect
+import collections
+import heapq
+import itertools
+import math
+import threading
+import unicodedata
+
+# Rangstufen: exakter Feldtreffer > Feldanfang > Wortanfang > Teilstring > unscharf
+EXACT, FIELD_PREFIX, WORD_PREFIX, SUBSTRING, FUZZY = 4, 3, 2, 1, 0
+FUZZY_THRESHOLD = 0.45
+# Höchstens so viele Kandidaten pro Stufe werden bewertet, wenn ein limit gesetzt ist
+CANDIDATE_CAP = 250
+# Mit limit höchstens so viele Kandidaten für unscharfe Treffer sammeln
+FUZZY_CANDIDATE_CAP = 500
+# Ab so vielen Änderungen in einem sync() werden die sortierten Listen neu aufgebaut statt einzeln gepflegt
+BULK_THRESHOLD = 1000
+
+
+def fold(text):
+    decomposed = unicodedata.normalize("NFKD", (text or "").casefold())
+    return " ".join("".join(c for c in decomposed if not unicodedata.combining(c)).split())
+
+
+def trigrams(text, padded=True):
+    if padded:
+        text = f" {text} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def word_starts(field):
+    """Teilstrings eines Felds ab jedem Wortanfang nach dem ersten."""
+    return [field[i + 1:] for i, c in enumerate(field) if c == " "]
+
+
+class SearchIndex:
+    def __init__(self):
+        self._keys = []          # doc_id -> Song-Key
+        self._doc_ids = {}       # Song-Key -> doc_id
+        self._fields = {}        # doc_id -> gefaltete Felder
+        self._signatures = {}    # doc_id -> Original-Felder, zum Erkennen von Änderungen
+        self._grams = {}         # Trigramm -> set(doc_id)
+        self._field_list = []    # sortiert: (Feld, doc_id)
+        self._word_list = []     # sortiert: (Feld ab Wortanfang, doc_id, Feldlänge)
+        self._sorted = True      # False: Listen werden vor der nächsten Suche neu aufgebaut
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._fields)
+
+    #############################
+    # Pflege
+    #############################
+    def _sorted_entries(self, doc_id, folded):
+        fields = [(f, doc_id) for f in set(folded) if f]
+        words = [(w, doc_id, len(f)) for f in set(folded) if f for w in word_starts(f)]
+        return fields, words
+
+    def _rebuild(self):
+        self._field_list = []
+        self._word_list = []
+        for doc_id, folded in self._fields.items():
+            fields, words = self._sorted_entries(doc_id, folded)
+            self._field_list.extend(fields)
+            self._word_list.extend(words)
+        self._field_list.sort()
+        self._word_list.sort()
+        self._sorted = True
+
+    def add(self, key, *fields):
+        with self._lock:
+            if key in self._doc_ids:
+                self.remove(key)
+            doc_id = len(self._keys)
+            self._keys.append(key)
+            self._doc_ids[key] = doc_id
+            folded = tuple(fold(f) for f in fields)
+            self._fields[doc_id] = folded
+            self._signatures[doc_id] = fields
+            for gram in set().union(*(trigrams(f) for f in folded if f)):
+                self._grams.setdefault(gram, set()).add(doc_id)
+            if self._sorted:
+                for entries, target in zip(self._sorted_entries(doc_id, folded), (self._field_list, self._word_list)):
+                    for entry in entries:
+                        bisect.insort(target, entry)
+
+    def remove(self, key):
+        with self._lock:
+            doc_id = self._doc_ids.pop(key, None)
+            if doc_id is None:
+                return
+            folded = self._fields.pop(doc_id)
+            del self._signatures[doc_id]
+            self._keys[doc_id] = None
+            for gram in set().union(*(trigrams(f) for f in folded if f)):
+                postings = self._grams.get(gram)
+                if postings is not None:
+                    postings.discard(doc_id)
+                    if not postings:
+                        del self._grams[gram]
+            if self._sorted:
+                for entries, target in zip(self._sorted_entries(doc_id, folded), (self._field_list, self._word_list)):
+                    for entry in entries:
+                        i = bisect.bisect_left(target, entry)
+                        if i < len(target) and target[i] == entry:
+                            del target[i]
+
+    def sync(self, metadata):
+        """
+        Gleicht den Index inkrementell mit den Songs-Metadaten ab: nur neue oder
+        umbenannte Songs werden neu indiziert, verschwundene entfernt.
+
+        :return: (Anzahl neu indizierter, Anzahl entfernter Songs)
+        """
+        with self._lock:
+            changed = []
+            for key, song in metadata.items():
+                fields = (song.get("track_name", ""), song.get("artist_name", ""))
+                doc_id = self._doc_ids.get(key)
+                if doc_id is None or self._signatures[doc_id] != fields:
+                    changed.append((key, fields))
+            removed = [key for key in self._doc_ids if key not in metadata]
+            if len(changed) + len(removed) >= BULK_THRESHOLD:
+                self._sorted = False
+            for key, fields in changed:
+                self.add(key, *fields)
+            for key in removed:
+                self.remove(key)
+            if not self._sorted:
+                self._rebuild()
+            return len(changed), len(removed)
+
+    #############################
+    # Suche
+    #############################
+    @staticmethod
+    def _prefix_range(entries, query, cap):
+        i = bisect.bisect_left(entries, (query,))
+        end = len(entries) if cap is None else min(len(entries), i + cap)
+        while i < end and entries[i][0].startswith(query):
+            yield entries[i]
+            i += 1
+
+    def _substring_candidates(self, query):
+        if len(query) < 3:
+            # Jedes Zeichenpaar eines Felds steckt in einem seiner (gepolsterten) Trigramme
+            return self._short_candidates(query)
+        # Ohne Ränder, damit auch Teilstrings mitten im Wort gefunden werden
+        postings = sorted((self._grams.get(g, set()) for g in trigrams(query, padded=False)), key=len)
+        candidates = set(postings[0]).intersection(*postings[1:]) if postings else set()
+        return (doc_id for doc_id in candidates if any(query in f for f in self._fields[doc_id]))
+
+    def _short_candidates(self, query):
+        seen = set()
+        for gram, postings in list(self._grams.items()):
+            if query in gram:
+                for doc_id in postings - seen:
+                    seen.add(doc_id)
+                    yield doc_id
+
+    def _fuzzy(self, query_grams, exclude, limit):
+        # Dice >= T bei s geteilten Trigrammen erfordert s >= T * |q| / (2 - T) ...
+        min_shared = max(1, math.ceil(FUZZY_THRESHOLD * len(query_grams) / (2 - FUZZY_THRESHOLD)))
+        # ... also mindestens eins der |q| - s + 1 seltensten Trigramme der Anfrage
+        postings = sorted((self._grams.get(g, set()) for g in query_grams), key=len)
+        candidates = set()
+        for rare in postings[:len(query_grams) - min_shared + 1]:
+            if limit is not None:
+                rare = itertools.islice(rare, FUZZY_CANDIDATE_CAP - len(candidates))
+            candidates.update(doc_id for doc_id in rare if doc_id not in exclude)
+            if limit is not None and len(candidates) >= FUZZY_CANDIDATE_CAP:
+                break
+        shared = collections.Counter(itertools.chain.from_iterable(candidates & p for p in postings))
+        eligible = [doc_id for doc_id, count in shared.items() if count >= min_shared]
+        if limit is not None:
+            # Die genaue Ähnlichkeit nur für die Kandidaten mit den meisten geteilten Trigrammen
+            eligible = heapq.nlargest(limit, eligible, key=lambda doc_id: (shared[doc_id], -doc_id))
+        results = []
+        for doc_id in eligible:
+            best = max(
+                2 * len(query_grams & grams) / (len(query_grams) + len(grams))
+                for grams in (trigrams(f) for f in self._fields[doc_id] if f)
+            )
+            if best >= FUZZY_THRESHOLD:
+                results.append(((FUZZY, best), doc_id))
+        return results
+
+    def search(self, query, limit=None, fuzzy=True):
+        """
+        Liefert die passenden Song-Keys, bestbewertete zuerst.
+
+        :param limit: höchstens so viele Keys; erlaubt den Abbruch nach ausreichend vielen Treffern
+        :param fuzzy: unscharfe Treffer ergänzen, wenn es weniger als `limit` (bzw. keine) exakten gibt
+        """
+        query = fold(query)
+        if not query:
+            return []
+        cap = None if limit is None else max(limit, CANDIDATE_CAP)
+        with self._lock:
+            if not self._sorted:
+                self._rebuild()
+            scores = {}
+
+            def offer(doc_id, score):
+                if doc_id not in scores or score > scores[doc_id]:
+                    scores[doc_id] = score
+
+            def enough():
+                return limit is not None and len(scores) >= limit
+
+            for field, doc_id in self._prefix_range(self._field_list, query, cap):
+                offer(doc_id, (EXACT if field == query else FIELD_PREFIX, -len(field)))
+            if not enough():
+                for _, doc_id, length in self._prefix_range(self._word_list, query, cap):
+                    offer(doc_id, (WORD_PREFIX, -length))
+            if not enough():
+                found = 0
+                for doc_id in self._substring_candidates(query):
+                    if doc_id in scores:
+                        continue
+                    offer(doc_id, (SUBSTRING, -min(len(f) for f in self._fields[doc_id] if query in f)))
+                    found += 1
+                    if cap is not None and found >= cap:
+                        break
+            if fuzzy and len(query) >= 3 and len(scores) < (limit or 1):
+                for score, doc_id in self._fuzzy(trigrams(query), set(scores), limit):
+                    offer(doc_id, score)
+            order = lambda item: (item[1], -item[0])
+            best = heapq.nlargest(limit, scores.items(), key=order) if limit else sorted(scores.items(), key=order, reverse=True)
+            return [self._keys[doc_id] for doc_id, _ in best]
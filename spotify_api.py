@@ -0,0 +1,359 @@
+"""
+Spotify-Helfer, die von allen Seiten gemeinsam genutzt werden.
+"""
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+import http_session
+
+SPOTIFY_API = "https://api.spotify.com/v1"
+TOKEN_URL = "https://open.spotify.com/get_access_token?reason=transport&productType=web_player"
+PATHFINDER_URL = "https://api-partner.spotify.com/pathfinder/v1/query"
+GET_TRACK_HASH = "26cd58ab86ebba80196c41c3d48a4324c619e9a9d7df26ecca22417e0c50c6a4"
+GET_ALBUM_HASH = "46ae954ef2d2fe7732b4b2b4022157b2e18b7ea84f70591ceb164e4de1b5d5d3"
+# Tracks pro getAlbum-Seite
+ALBUM_PAGE_SIZE = 50
+# Maximale Anzahl IDs pro Request bei /v1/tracks?ids= und /v1/artists?ids=
+BATCH_SIZE = 50
+# Wiederholungen eines Blocks nach 429/5xx (Wartezeit aus Retry-After, sonst exponentiell)
+BATCH_RETRIES = 3
+BATCH_RETRY_STATUS = {429, 500, 502, 503, 504}
+# So viele Sekunden vor Ablauf wird der Token im Hintergrund erneuert
+REFRESH_MARGIN = 60
+
+
+#############################
+# Access Token
+#############################
+class SpotifyTokenManager:
+    """
+    Prozessweiter Web-Player-Token: wird erst beim ersten Zugriff geholt, bis
+    `accessTokenExpirationTimestampMs` gecacht und kurz vorher im Hintergrund erneuert.
+    """
+
+    def __init__(self):
+        self._token = None
+        self._expires_at = 0
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def get(self):
+        with self._lock:
+            if self._token is None or time.time() >= self._expires_at - REFRESH_MARGIN:
+                self._refresh()
+            return self._token
+
+    def invalidate(self, token):
+        """Verwirft den Token nach einem 401, sofern nicht schon ein neuer geholt wurde."""
+        with self._lock:
+            if token == self._token:
+                self._token = None
+
+    def _refresh(self):
+        r = http_session.get(TOKEN_URL)
+        r.raise_for_status()
+        data = r.json()
+        self._token = data.get("accessToken")
+        expires_ms = data.get("accessTokenExpirationTimestampMs")
+        self._expires_at = expires_ms / 1000 if expires_ms else time.time() + 3600
+        self._schedule_refresh()
+
+    def _schedule_refresh(self):
+        if self._timer:
+            self._timer.cancel()
+        delay = max(self._expires_at - time.time() - REFRESH_MARGIN, 5)
+        self._timer = threading.Timer(delay, self._background_refresh)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _background_refresh(self):
+        try:
+            with self._lock:
+                self._refresh()
+        except requests.RequestException:
+            # Der nächste get() versucht es erneut
+            pass
+
+
+token_manager = SpotifyTokenManager()
+
+
+def spotify_get(url, params=None, headers=None):
+    """GET mit aktuellem Token; bei 401 wird der Token einmal erneuert und der Request wiederholt."""
+    for attempt in range(2):
+        token = token_manager.get()
+        r = http_session.get(url, headers={**(headers or {}), "Authorization": f"Bearer {token}"}, params=params)
+        if r.status_code != 401:
+            return r
+        token_manager.invalidate(token)
+    return r
+
+
+def chunked(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _get_chunk(endpoint, chunk):
+    delay = 1
+    for attempt in range(BATCH_RETRIES + 1):
+        r = spotify_get(f"{SPOTIFY_API}/{endpoint}", params={"ids": ",".join(chunk)})
+        if r.status_code not in BATCH_RETRY_STATUS or attempt == BATCH_RETRIES:
+            r.raise_for_status()
+            return r.json()
+        retry_after = r.headers.get("Retry-After")
+        try:
+            wait = float(retry_after) if retry_after else delay
+        except ValueError:
+            wait = delay
+        time.sleep(wait)
+        delay = min(delay * 2, 30)
+
+
+def _fetch_batch(endpoint, key, ids, errors=None):
+    """
+    Löst IDs in Blöcken von 50 über einen Multi-ID-Endpoint auf (dict id -> Objekt).
+
+    :param errors: optional Liste; fehlgeschlagene Blöcke landen dort als (IDs, Exception)
+        und werden übersprungen, statt den ganzen Abruf abzubrechen
+    """
+    unique_ids = list(dict.fromkeys(i for i in ids if i))
+    results = {}
+    for chunk in chunked(unique_ids, BATCH_SIZE):
+        try:
+            data = _get_chunk(endpoint, chunk)
+        except requests.RequestException as e:
+            if errors is None:
+                raise
+            errors.append((chunk, e))
+            continue
+        for obj in data.get(key, []):
+            # Unbekannte IDs liefert Spotify als null zurück
+            if obj and obj.get("id"):
+                results[obj["id"]] = obj
+    return results
+
+
+def fetch_tracks(track_ids, errors=None):
+    return _fetch_batch("tracks", "tracks", track_ids, errors)
+
+
+def fetch_artists(artist_ids, errors=None):
+    return _fetch_batch("artists", "artists", artist_ids, errors)
+
+
+def _pathfinder(operation, sha256_hash, variables):
+    extensions = json.dumps({"persistedQuery": {"version": 1, "sha256Hash": sha256_hash}})
+    params = {"operationName": operation, "variables": json.dumps(variables), "extensions": extensions}
+    r = spotify_get(PATHFINDER_URL, params=params)
+    r.raise_for_status()
+    return r.json()["data"]
+
+
+def get_playcount(track_id):
+    """Streams eines Tracks über die persisted query `getTrack` des Web-Players."""
+    data = _pathfinder("getTrack", GET_TRACK_HASH, {"uri": f"spotify:track:{track_id}"})
+    return int(data["trackUnion"].get("playcount", 0))
+
+
+def get_album_playcounts(album_id):
+    """Streams aller Tracks eines Albums über die persisted query `getAlbum` (dict track_id -> Streams)."""
+    counts = {}
+    offset = 0
+    while True:
+        variables = {"uri": f"spotify:album:{album_id}", "locale": "", "offset": offset, "limit": ALBUM_PAGE_SIZE}
+        album = _pathfinder("getAlbum", GET_ALBUM_HASH, variables)["albumUnion"]
+        # Je nach Version des Web-Players heißt das Feld tracksV2 oder tracks
+        tracks = album.get("tracksV2") or album.get("tracks") or {}
+        items = tracks.get("items", [])
+        for item in items:
+            track = item.get("track", {})
+            uri = track.get("uri", "")
+            if uri.startswith("spotify:track:") and track.get("playcount") is not None:
+                counts[uri.rsplit(":", 1)[1]] = int(track["playcount"])
+        offset += len(items)
+        if not items or offset >= tracks.get("totalCount", 0):
+            return counts
+
+
+def primary_artist_id(track):
+    artists = track.get("artists", []) if track else []
+    return artists[0].get("id") if (artists and artists[0].get("id")) else ""
+
+
+def track_assets(track):
+    """Cover-URL und Spotify-Link eines Track-Objekts."""
+    track = track or {}
+    images = track.get("album", {}).get("images") or []
+    return {
+        "cover_url": images[0].get("url", "") if images else "",
+        "track_url": track.get("external_urls", {}).get("spotify", "")
+    }
+
+
+def pick_country_code(track, preferred_markets=("DE", "AT", "CH")):
+    available_markets = track.get("album", {}).get("available_markets", [])
+    for m in available_markets:
+        if m in preferred_markets:
+            return m
+    return available_markets[0] if available_markets else ""
+
+
+#############################
+# Caches
+#############################
+class TTLCache:
+    """Thread-sicherer dict-Cache, dessen Einträge nach `ttl` Sekunden verfallen."""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if time.time() - stored_at > self.ttl:
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.time(), value)
+
+
+class ArtistCache(TTLCache):
+    """
+    Artist-Daten (Popularity, Follower, Bild, monatliche Hörer) pro artist_id,
+    damit jeder Artist pro Refresh-Fenster höchstens einmal abgefragt wird.
+    """
+
+    def resolve(self, artist_ids, get_monthly_listeners, errors=None, max_workers=8):
+        """
+        Liefert dict artist_id -> Artist-Info. Nur fehlende oder abgelaufene
+        Artists werden (gebündelt) bei Spotify geholt und parallel gescrapt;
+        den Host begrenzt zusätzlich der Limiter in http_session.
+
+        :param errors: wie bei fetch_artists; ohne Liste bricht ein fehlgeschlagener Block ab
+        """
+        infos = {}
+        missing = []
+        for artist_id in dict.fromkeys(a for a in artist_ids if a):
+            info = self.get(artist_id)
+            if info is None:
+                missing.append(artist_id)
+            else:
+                infos[artist_id] = info
+        artists = fetch_artists(missing, errors)
+        if not artists:
+            return infos
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            listeners = dict(zip(artists, executor.map(get_monthly_listeners, artists)))
+        for artist_id, adata in artists.items():
+            images = adata.get("images") or []
+            followers = adata.get("followers", {}).get("total", 0)
+            monthly_listeners = listeners[artist_id]
+            info = {
+                "artist_pop": adata.get("popularity", 0),
+                "artist_followers": followers,
+                "artist_image": images[0].get("url", "") if images else "",
+                "monthly_listeners": followers if monthly_listeners is None else monthly_listeners
+            }
+            self.set(artist_id, info)
+            infos[artist_id] = info
+        return infos
+
+
+class PlaycountCache(TTLCache):
+    """
+    Streams pro track_id, gemeinsam für Scanner und Refresh, damit ein Track pro
+    TTL-Fenster nur einmal über pathfinder abgefragt wird.
+    """
+
+    def resolve(self, track_ids, albums=None, max_workers=8):
+        """
+        Liefert dict track_id -> Streams; fehlende werden parallel geholt. Fehlgeschlagene
+        Abfragen ergeben None und werden nicht gecacht.
+
+        :param albums: optional dict track_id -> album_id. Liegen mehrere fehlende Tracks
+            auf demselben Album, kommen ihre Streams mit einem getAlbum-Call; nur die
+            übrigen (und im Album nicht gefundene) laufen einzeln über getTrack.
+        """
+        counts = {}
+        missing = []
+        for track_id in dict.fromkeys(t for t in track_ids if t):
+            count = self.get(track_id)
+            if count is None:
+                missing.append(track_id)
+            else:
+                counts[track_id] = count
+        if not missing:
+            return counts
+        by_album = {}
+        for track_id in missing:
+            by_album.setdefault((albums or {}).get(track_id), []).append(track_id)
+        album_ids = [album_id for album_id, ids in by_album.items() if album_id and len(ids) > 1]
+        wanted = set(missing)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for album_counts in executor.map(self._fetch_album, album_ids):
+                # Auch die übrigen Tracks des Albums cachen, sie kosten nichts extra
+                for track_id, count in album_counts.items():
+                    self.set(track_id, count)
+                counts.update((t, c) for t, c in album_counts.items() if t in wanted)
+            stragglers = [track_id for track_id in missing if track_id not in counts]
+            for track_id, count in zip(stragglers, executor.map(self._fetch, stragglers)):
+                if count is not None:
+                    self.set(track_id, count)
+                counts[track_id] = count
+        return counts
+
+    @staticmethod
+    def _fetch(track_id):
+        try:
+            return get_playcount(track_id)
+        except (requests.RequestException, KeyError, ValueError, TypeError):
+            return None
+
+    @staticmethod
+    def _fetch_album(album_id):
+        try:
+            return get_album_playcounts(album_id)
+        except (requests.RequestException, KeyError, ValueError, TypeError):
+            return {}
+
+
+DEFAULT_ARTIST_TTL = 6 * 3600
+DEFAULT_PLAYCOUNT_TTL = 3600
+_artist_cache = None
+_playcount_cache = None
+_caches_lock = threading.Lock()
+
+
+def get_artist_cache(ttl=None):
+    """Prozessweiter Artist-Cache; `ttl` (Sekunden) überschreibt die Standard-Laufzeit."""
+    global _artist_cache
+    with _caches_lock:
+        if _artist_cache is None:
+            _artist_cache = ArtistCache(DEFAULT_ARTIST_TTL)
+        if ttl is not None:
+            _artist_cache.ttl = ttl
+        return _artist_cache
+
+
+def get_playcount_cache(ttl=None):
+    """Prozessweiter Streams-Cache; `ttl` (Sekunden) überschreibt die Standard-Laufzeit."""
+    global _playcount_cache
+    with _caches_lock:
+        if _playcount_cache is None:
+            _playcount_cache = PlaycountCache(DEFAULT_PLAYCOUNT_TTL)
+        if ttl is not None:
+            _playcount_cache.ttl = ttl
+        return _playcount_cache
@@ -0,0 +1,97 @@
+import datetime
+
+from notion_store import (MEASUREMENT_PROPERTIES, compact_measurements, dirty_rollups, load_metadata,
+                          mark_rollup_synced, open_store, rollup_properties, sync_measurements, sync_rollups,
+                          upsert_song)
+
+NOW = datetime.datetime(2026, 6, 1, 12, 0, tzinfo=datetime.timezone.utc)
+SONG = "song-page"
+
+
+def measurement_pages():
+    pages = []
+    for i in range(40):
+        # Alle vier Tage zwei Messungen, von ~160 Tagen alt bis heute
+        for hour in (8, 20):
+            created = (NOW - datetime.timedelta(days=160 - 4 * i)).replace(hour=hour, minute=0)
+            pages.append({
+                "id": f"m-{i}-{hour}",
+                "created_time": created.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+                "last_edited_time": created.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+                "properties": {
+                    "Song": {"relation": [{"id": SONG}]},
+                    **{label: {"number": i + hour} for label in MEASUREMENT_PROPERTIES.values()}
+                }
+            })
+    return pages
+
+
+class FakeNotion:
+    """Measurements- und Rollup-Datenbank; Filter werden ignoriert, es kommt immer alles."""
+
+    def __init__(self):
+        self.databases = {"measurements": measurement_pages(), "rollups": {}}
+
+    def query(self, database_id, filter=None):
+        pages = self.databases[database_id]
+        return list(pages.values()) if isinstance(pages, dict) else list(pages)
+
+    def push_rollups(self, conn):
+        with conn:
+            for row in dirty_rollups(conn):
+                page_id = row["page_id"] or f"r-{row['granularity']}-{row['bucket']}"
+                self.databases["rollups"][page_id] = {
+                    "id": page_id, "last_edited_time": NOW.isoformat(), "properties": rollup_properties(row)
+                }
+                mark_rollup_synced(conn, row, page_id)
+
+
+def fresh_mirror():
+    conn = open_store(":memory:")
+    upsert_song(conn, {"page_id": SONG, "track_name": "Song", "artist_name": "Artist", "artist_id": "a",
+                       "track_id": "t", "release_date": "", "country_code": "", "last_edited": "",
+                       "favourite": False, "measurements_ids": []})
+    return conn
+
+
+def totals(conn):
+    rollup_count = conn.execute("SELECT COALESCE(SUM(count), 0) FROM rollups").fetchone()[0]
+    raw_count = conn.execute("SELECT COUNT(*) FROM measurements").fetchone()[0]
+    return rollup_count + raw_count, len(load_metadata(conn)["t"]["measurements"])
+
+
+def test_restore_does_not_double_count():
+    notion = FakeNotion()
+    conn = fresh_mirror()
+    sync_measurements(conn, "measurements", notion.query)
+    compact_measurements(conn, now=NOW)
+    notion.push_rollups(conn)
+    expected = totals(conn)
+    assert expected[0] == 80
+
+    # Spiegel verloren: Rollups zuerst (wie in der App) und umgekehrt
+    for order in ((sync_rollups, "rollups"), (sync_measurements, "measurements")), \
+                 ((sync_measurements, "measurements"), (sync_rollups, "rollups")):
+        restored = fresh_mirror()
+        for sync, database_id in order:
+            sync(restored, database_id, notion.query)
+        assert totals(restored) == expected
+        compact_measurements(restored, now=NOW)
+        assert totals(restored) == expected
+        assert dirty_rollups(restored) == []
+
+
+def test_restore_keeps_uncompacted_measurements_of_rolled_up_day():
+    notion = FakeNotion()
+    conn = fresh_mirror()
+    sync_measurements(conn, "measurements", notion.query)
+    # Cutoff mitten am Tag vor acht Tagen: dessen Abendmessung bleibt roh
+    compact_measurements(conn, now=NOW.replace(hour=14) - datetime.timedelta(days=1))
+    notion.push_rollups(conn)
+    restored = fresh_mirror()
+    sync_rollups(restored, "rollups", notion.query)
+    sync_measurements(restored, "measurements", notion.query)
+    assert totals(restored) == totals(conn)
+    assert {row["id"] for row in restored.execute("SELECT id FROM measurements")} == \
+        {row["id"] for row in conn.execute("SELECT id FROM measurements")}
+